@@ -0,0 +1,403 @@
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import discord
+from aiohttp import web
+from discord.ext import commands
+
+import song as song_module
+from cache import DownloadCache
+from extractor import extractor
+from history import history
+from jsons import Jsons
+from metadata import MetadataCache
+from play_sound import PlaySound
+from player import Player
+from snapshot import SnapshotStore
+from song import (
+    DiscordMessageLinkSong,
+    DiscordMessageSong,
+    OnlineSong,
+    Song,
+    YoutubeSong,
+    YtDlpSong,
+)
+from tests.conftest import FakeChannel, FakeVoiceClient, make_track
+
+FRAME_SEC = 0.02
+SERVE_CHUNK = 64 * 1024
+KINDS = ("ytdlp", "youtube", "online", "attachment", "link")
+EXTRACTORS = ("stub", "pool")
+METRICS = ("resolve", "download", "source_open", "first_frame", "gap")
+
+STUB = """#!{python}
+import json
+import os
+import sys
+import urllib.request
+
+args = sys.argv[1:]
+
+
+def opt(name):
+    return args[args.index(name) + 1]
+
+
+if "--load-info-json" in args:
+    with open(opt("--load-info-json")) as f:
+        info = json.load(f)
+else:
+    id = args[-1][-11:]
+    info = {{
+        "id": id,
+        "extractor_key": "Youtube",
+        "title": "bench " + id,
+        "duration": float(os.environ["BENCH_TRACK_SEC"]),
+        "thumbnail": None,
+        "ext": "wav",
+        "url": os.environ["BENCH_SERVER"] + "/track/" + id + ".wav",
+        "webpage_url": args[-1],
+    }}
+if "-j" in args:
+    print(json.dumps(info))
+    sys.exit(0)
+out = (
+    opt("-o")
+    .replace("%(extractor_key)s", info["extractor_key"])
+    .replace("%(id)s", info["id"])
+    .replace("%(ext)s", info["ext"])
+)
+if "--get-filename" in args:
+    print(out)
+    sys.exit(0)
+with urllib.request.urlopen(info["url"]) as res, open(out, "wb") as f:
+    while chunk := res.read(64 * 1024):
+        f.write(chunk)
+        f.flush()
+if "--print" in args:
+    print(out)
+"""
+
+
+def install_stub(bindir: Path):
+    for name in ("yt-dlp", "youtube-dl"):
+        path = bindir.joinpath(name)
+        path.write_text(STUB.format(python=sys.executable))
+        path.chmod(0o755)
+
+
+def percentile(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, max(math.ceil(p * len(values)) - 1, 0))]
+
+
+def summarize(values: list[float]):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p99": percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+class BenchVoiceClient(FakeVoiceClient):
+    def __init__(self, bench: "Bench", channel) -> None:
+        super().__init__(channel, frame_sec=FRAME_SEC / bench.speed)
+        self.bench = bench
+        self.last_frame: float | None = None
+
+    def on_frame(self, tag, first: bool):
+        now = time.perf_counter()
+        if first:
+            self.bench.loop.call_soon_threadsafe(
+                self.bench.first_frame, tag, now, self.last_frame
+            )
+        self.last_frame = now
+
+    def on_end(self, tag):
+        self.bench.loop.call_soon_threadsafe(self.bench.finished, tag)
+
+
+class Bench:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.speed: float = args.speed
+        self.track = make_track(args.track_sec)
+        self.loop = asyncio.get_running_loop()
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.enqueued: dict[str, float] = {}
+        self.first: set[str] = set()
+        self.remaining = 0
+        self.done: asyncio.Future[None] = self.loop.create_future()
+        self.path = os.environ["PATH"]
+
+    async def serve_track(self, request: web.Request):
+        res = web.StreamResponse(headers={"Content-Type": "audio/wav"})
+        res.content_length = len(self.track)
+        await res.prepare(request)
+        for i in range(0, len(self.track), SERVE_CHUNK):
+            await res.write(self.track[i : i + SERVE_CHUNK])
+            if self.args.rate > 0:
+                await asyncio.sleep(SERVE_CHUNK / self.args.rate)
+        await res.write_eof()
+        return res
+
+    def first_frame(self, song, now: float, previous: float | None):
+        if previous is not None:
+            self.samples["gap"].append(now - previous)
+        if song is not None and song.key in self.first:
+            self.first.discard(song.key)
+            self.samples["first_frame"].append(now - self.enqueued[song.key])
+
+    def finished(self, song):
+        if song is not None:
+            if (resolve := song.elapsed("resolve_start", "resolved")) is not None:
+                self.samples["resolve"].append(resolve)
+            if (download := song.elapsed("requested", "downloaded")) is not None:
+                self.samples["download"].append(download)
+        self.remaining -= 1
+        if self.remaining <= 0 and not self.done.done():
+            self.done.set_result(None)
+
+    def patch(self):
+        open_ = Player.open
+        start = Player.start
+
+        async def timed_open(player: Player, song):
+            begin = time.perf_counter()
+            try:
+                return await open_(player, song)
+            finally:
+                self.samples["source_open"].append(time.perf_counter() - begin)
+
+        def tagged_start(player: Player, song, source):
+            player.voice_client.tag = song  # type: ignore
+            start(player, song, source)
+
+        Player.open = timed_open  # type: ignore
+        Player.start = tagged_start  # type: ignore
+
+    def redirect(self, root: Path):
+        song_module.tempdir.tempdir = root
+        song_module.cache = DownloadCache(root.joinpath("tracks"))
+        song_module.metadata = MetadataCache(root.joinpath("metadata.json"))
+        song_module.packets = song_module.tempdir.subdir("packets")
+        history.file = root.joinpath("history.sqlite3")
+
+    async def connect(self, channel):
+        return BenchVoiceClient(self, channel)
+
+    def member(self, guild_id: int):
+        guild = SimpleNamespace(
+            id=guild_id, name=f"bench {guild_id}", voice_client=None
+        )
+        guild.get_member = lambda _: None
+        channel = SimpleNamespace(id=guild_id)
+        channel.connect = lambda: self.connect(channel)
+        return SimpleNamespace(
+            id=guild_id, guild=guild, voice=SimpleNamespace(channel=channel)
+        )
+
+    async def enqueue(self, cog: PlaySound, author, kind: str, n: int, server: str):
+        guild_id = author.guild.id
+        id = f"g{guild_id:04}t{n:05}"
+        url = f"{server}/track/{id}.wav"
+        message = SimpleNamespace(
+            attachments=[
+                SimpleNamespace(
+                    filename=f"{id}.wav",
+                    content_type="audio/wav",
+                    size=len(self.track),
+                    url=url,
+                )
+            ],
+            jump_url=f"https://discord.com/channels/{guild_id}/1/{n}",
+        )
+        if kind == "ytdlp" and self.args.extractor == "stub":
+            key = self.mark(f"youtube:{id}")
+            ctx = SimpleNamespace(
+                guild=author.guild,
+                author=author,
+                channel=None,
+                send=self.noop,
+                defer=self.noop,
+            )
+            await PlaySound.play.callback(
+                cog, ctx, f"https://www.youtube.com/watch?v={id}"  # type: ignore
+            )
+            return key
+
+        player = await cog.get_player_or_make(guild_id, author)
+        # the worker pool runs the real yt-dlp, so point it at the local server
+        song: Song
+        if kind == "ytdlp":
+            song = YtDlpSong(author, url)
+        elif kind == "youtube" and self.args.extractor == "pool":
+            song = YoutubeSong(author, url)
+        elif kind == "youtube":
+            song = YoutubeSong(author, f"https://youtu.be/{id}")
+        elif kind == "online":
+            song = OnlineSong(author, url, cog.http)
+        elif kind == "attachment":
+            song = DiscordMessageSong(author, message, cog.http)  # type: ignore
+        else:
+            client = SimpleNamespace(get_channel=lambda _: FakeChannel({n: message}))
+            song = DiscordMessageLinkSong(
+                author,
+                cog.http,
+                f"https://discord.com/channels/{guild_id}/1/{n}",
+                client,  # type: ignore
+            )
+        key = self.mark(song.key)  # type: ignore
+        player.add(song)
+        return key
+
+    def mark(self, key: str):
+        self.enqueued[key] = time.perf_counter()
+        return key
+
+    async def noop(self, *args, **kwargs):
+        pass
+
+    async def run(self, guilds: int) -> dict:
+        self.samples.clear()
+        self.enqueued.clear()
+        self.first.clear()
+        self.remaining = guilds * self.args.songs
+        self.done = self.loop.create_future()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            bindir = root.joinpath("bin")
+            bindir.mkdir()
+            install_stub(bindir)
+            self.redirect(root)
+
+            app = web.Application()
+            app.router.add_get("/track/{name}", self.serve_track)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]  # type: ignore
+            server = f"http://127.0.0.1:{port}"
+            os.environ["BENCH_SERVER"] = server
+            os.environ["BENCH_TRACK_SEC"] = str(self.args.track_sec)
+            os.environ["PATH"] = f"{bindir}{os.pathsep}{self.path}"
+
+            begin = time.perf_counter()
+            async with commands.Bot(
+                command_prefix="!", intents=discord.Intents.none()
+            ) as bot:
+                cog = PlaySound(bot)
+                cog.warm_cache.cancel()
+                cog.save_snapshots.cancel()
+                cog.data = Jsons(root.joinpath("data.json"))
+                cog.snapshots = SnapshotStore(root.joinpath("snapshot.json"))
+                authors = [self.member(x + 1) for x in range(guilds)]
+                kinds = self.args.kinds
+                for n in range(self.args.songs):
+                    for author in authors:
+                        kind = kinds[(author.guild.id + n) % len(kinds)]
+                        key = await self.enqueue(cog, author, kind, n, server)
+                        if n == 0:
+                            self.first.add(key)
+                try:
+                    await asyncio.wait_for(self.done, self.args.timeout)
+                    timed_out = False
+                except TimeoutError:
+                    timed_out = True
+                wall = time.perf_counter() - begin
+                for guild_id, player in list(cog.players.items()):
+                    await player.voice_client.disconnect()
+                    cog.drop_player(guild_id)
+                await cog.http.close()
+                await history.close()
+            await runner.cleanup()
+            extractor.shutdown()
+            for process in multiprocessing.active_children():
+                process.join(1)
+
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks():
+            if task is not current:
+                task.cancel()
+
+        return {
+            "guilds": guilds,
+            "songs_per_guild": self.args.songs,
+            "timed_out": timed_out,
+            "wall_sec": wall,
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "children_peak_rss_kb": resource.getrusage(
+                resource.RUSAGE_CHILDREN
+            ).ru_maxrss,
+            "metrics": {x: summarize(self.samples[x]) for x in METRICS},
+        }
+
+
+def isolated(args: argparse.Namespace, guilds: int) -> dict:
+    async def run():
+        if args.extractor == "stub":
+            # route every extraction through the stub yt-dlp on PATH
+            extractor._available = False
+        bench = Bench(args)
+        bench.patch()
+        return await bench.run(guilds)
+
+    return asyncio.run(run())
+
+
+def main(args: argparse.Namespace):
+    # one fresh process per run so peak RSS belongs to that run alone
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for guilds in args.guilds:
+        with ProcessPoolExecutor(1, mp_context=context) as pool:
+            runs.append(pool.submit(isolated, args, guilds).result())
+    return {
+        "config": {
+            "guilds": args.guilds,
+            "songs": args.songs,
+            "kinds": args.kinds,
+            "extractor": args.extractor,
+            "track_sec": args.track_sec,
+            "speed": args.speed,
+            "rate": args.rate,
+        },
+        "runs": runs,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--songs", type=int, default=5)
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--extractor", choices=EXTRACTORS, default="stub")
+    parser.add_argument("--track-sec", type=float, default=5.0)
+    parser.add_argument("--speed", type=float, default=20.0)
+    parser.add_argument("--rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    result = json.dumps(main(args), indent=2)
+    if args.output is not None:
+        args.output.write_text(result)
+    else:
+        print(result)
@@ -0,0 +1,114 @@
+import random
+import timeit
+from collections import deque
+
+from queues import Queue
+
+
+class DequeQueue:
+    def __init__(self):
+        self._queue: deque = deque()
+
+    def put(self, item):
+        self._queue.append(item)
+
+    def insert(self, index, item):
+        self._queue.insert(index, item)
+
+    def move(self, old_index: int, target_index: int):
+        tmp = self._queue[old_index]
+        del self._queue[old_index]
+        self._queue.insert(target_index, tmp)
+
+    def remove_index(self, i: int):
+        del self._queue[i]
+
+    def index(self, item):
+        for i, x in enumerate(self._queue):
+            if x is item:
+                return i
+        raise ValueError
+
+    def drop_front(self, k: int):
+        for _ in range(k):
+            self._queue.popleft()
+
+    def remove_where(self, pred):
+        for i, x in reversed(list(enumerate(self._queue))):
+            if pred(x):
+                self.remove_index(i)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def __getitem__(self, i: int):
+        return self._queue[i]
+
+
+def fill(queue, n: int):
+    for i in range(n):
+        queue.put(object() if i % 2 else i)
+    return queue
+
+
+def lookups(queue, n: int, rounds: int):
+    rng = random.Random(0)
+    items = [queue[i] for i in range(0, n, max(n // 64, 1))]
+    for _ in range(rounds):
+        queue.index(rng.choice(items))
+
+
+def ops(queue, n: int, rounds: int):
+    rng = random.Random(0)
+    for _ in range(rounds):
+        queue.move(rng.randrange(n), rng.randrange(n))
+        queue.insert(rng.randrange(n), -1)
+        queue.remove_index(rng.randrange(n))
+
+
+def bench(n: int, rounds: int = 200, repeat: int = 3):
+    res = {}
+    for name, factory in (("deque", DequeQueue), ("indexed", Queue)):
+        res[f"{name} positional"] = min(
+            timeit.repeat(
+                "ops(q, n, rounds)",
+                setup="q = fill(factory(), n)",
+                globals={**globals(), "factory": factory, "n": n, "rounds": rounds},
+                number=1,
+                repeat=repeat,
+            )
+        )
+        res[f"{name} index"] = min(
+            timeit.repeat(
+                "lookups(q, n, rounds)",
+                setup="q = fill(factory(), n)",
+                globals={**globals(), "factory": factory, "n": n, "rounds": rounds},
+                number=1,
+                repeat=repeat,
+            )
+        )
+        res[f"{name} remove_where"] = min(
+            timeit.repeat(
+                "q.remove_where(lambda x: isinstance(x, int))",
+                setup="q = fill(factory(), n)",
+                globals={**globals(), "factory": factory, "n": n},
+                number=1,
+                repeat=repeat,
+            )
+        )
+        res[f"{name} drop_front"] = min(
+            timeit.repeat(
+                "q.drop_front(n // 2)",
+                setup="q = fill(factory(), n)",
+                globals={**globals(), "factory": factory, "n": n},
+                number=1,
+                repeat=repeat,
+            )
+        )
+    return res
+
+
+if __name__ == "__main__":
+    for n in (100, 1_000, 5_000, 20_000, 100_000):
+        for name, sec in bench(n).items():
+            print(f"n={n:>6} {name:<22} {sec * 1000:9.3f} ms")
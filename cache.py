@@ -0,0 +1,307 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Literal
+
+from shards import file_lock, try_lock
+
+CACHE_MAX_BYTES = int(os.environ.get("PLAY_SOUND_CACHE_BYTES", str(2 * 1024**3)))
+CACHE_POLICY: Literal["lru", "lfu"] = "lru"
+INDEX_NAME = "index.json"
+PARTIAL_SUFFIXES = (".part", ".ytdl", ".tmp")
+LOCK_NAME = ".lock"
+LEASE_POLL_SEC = 0.25
+
+
+@dataclass
+class CacheEntry:
+    filename: str
+    size: int
+    last_access: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+class DownloadCache:
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = CACHE_MAX_BYTES,
+        policy: Literal["lru", "lfu"] = CACHE_POLICY,
+    ) -> None:
+        if not directory.is_dir():
+            directory.mkdir(parents=True)
+        self.directory = directory
+        self.index_file = directory.joinpath(INDEX_NAME)
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.lock_file = directory.joinpath(LOCK_NAME)
+        self.entries: dict[str, CacheEntry] = {}
+        self.pins: Counter[str] = Counter()
+        self.handles: dict[str, int] = {}
+        # lookups run on the event loop while add/evict/scan run in worker threads
+        self.mutex = threading.RLock()
+        self.scan()
+
+    @staticmethod
+    def make_key(extractor: str, id: str) -> str:
+        return f"{extractor.lower()}:{id}"
+
+    @staticmethod
+    def filename_template():
+        return "%(extractor_key)s-%(id)s.%(ext)s"
+
+    @staticmethod
+    def key_from_filename(filename: str) -> str | None:
+        stem, dot, _ = filename.rpartition(".")
+        extractor, sep, id = stem.partition("-")
+        if not (dot and sep and extractor and id):
+            return None
+        return DownloadCache.make_key(extractor, id)
+
+    def __contains__(self, key: str):
+        with self.mutex:
+            return key in self.entries
+
+    @property
+    def total_bytes(self):
+        with self.mutex:
+            return sum(x.size for x in self.entries.values())
+
+    def path(self, key: str) -> Path:
+        return self.directory.joinpath(self.entries[key].filename)
+
+    def lease_path(self, key: str) -> Path:
+        return self.directory.joinpath("." + key.replace(":", "-").replace("/", "_"))
+
+    @staticmethod
+    def same_file(fd: int, path: Path):
+        try:
+            return os.path.samestat(os.fstat(fd), os.stat(path))
+        except FileNotFoundError:
+            return False
+
+    @asynccontextmanager
+    async def lease(self, key: str):
+        path = self.lease_path(key)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            while not try_lock(fd):
+                await asyncio.sleep(LEASE_POLL_SEC)
+            # the previous holder unlinked the file, so this lock guards nothing
+            if self.same_file(fd, path):
+                break
+            os.close(fd)
+        try:
+            yield
+        finally:
+            self.drop_lease(path, fd)
+
+    @staticmethod
+    def drop_lease(path: Path, fd: int):
+        try:
+            path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def clear_lease(self, key: str):
+        path = self.lease_path(key)
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except FileNotFoundError:
+            return
+        if try_lock(fd) and self.same_file(fd, path):
+            self.drop_lease(path, fd)
+        else:
+            os.close(fd)
+
+    def leased(self, key: str) -> bool:
+        try:
+            fd = os.open(self.lease_path(key), os.O_RDWR)
+        except FileNotFoundError:
+            return False
+        try:
+            return not try_lock(fd, shared=True)
+        finally:
+            os.close(fd)
+
+    def read_index(self) -> dict[str, CacheEntry]:
+        try:
+            index = json.loads(self.index_file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        return {k: CacheEntry(**v) for k, v in index.get("entries", {}).items()}
+
+    def refresh(self):
+        index = self.read_index()
+        with self.mutex:
+            self._refresh(index)
+
+    def _refresh(self, index: dict[str, CacheEntry]):
+        for key, entry in index.items():
+            mine = self.entries.get(key)
+            if mine is None or mine.filename != entry.filename:
+                if self.directory.joinpath(entry.filename).is_file():
+                    self.entries[key] = entry
+                continue
+            mine.last_access = max(mine.last_access, entry.last_access)
+            mine.hits = max(mine.hits, entry.hits)
+
+    def lookup(self, key: str) -> Path | None:
+        if key not in self:
+            self.refresh()
+        with self.mutex:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            path = self.directory.joinpath(entry.filename)
+            if not path.is_file():
+                del self.entries[key]
+                return None
+            entry.last_access = time.time()
+            entry.hits += 1
+            return path
+
+    def acquire(self, key: str) -> Path | None:
+        with self.mutex:
+            if (path := self.lookup(key)) is None:
+                return None
+            if not self.pin(key):
+                return None
+            return path
+
+    def add(self, key: str, path: Path):
+        with file_lock(self.lock_file), self.mutex:
+            self.refresh()
+            self.entries[key] = CacheEntry(path.name, path.stat().st_size)
+            self.pin(key)
+            self._evict()
+            self._save()
+        return path
+
+    def pin(self, key: str) -> bool:
+        with self.mutex:
+            return self._pin(key)
+
+    def _pin(self, key: str) -> bool:
+        if self.pins[key] == 0:
+            try:
+                fd = os.open(self.path(key), os.O_RDONLY)
+            except FileNotFoundError:
+                del self.pins[key]
+                return False
+            if not try_lock(fd, shared=True):
+                os.close(fd)
+                del self.pins[key]
+                return False
+            self.handles[key] = fd
+        self.pins[key] += 1
+        return True
+
+    def unpin(self, key: str):
+        with self.mutex:
+            self.pins[key] -= 1
+            if self.pins[key] <= 0:
+                del self.pins[key]
+                if (fd := self.handles.pop(key, None)) is not None:
+                    os.close(fd)
+
+    def _rank(self, item: tuple[str, CacheEntry]):
+        _, entry = item
+        if self.policy == "lfu":
+            return (entry.hits, entry.last_access)
+        return (entry.last_access, entry.hits)
+
+    def evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        with file_lock(self.lock_file), self.mutex:
+            self.refresh()
+            self._evict()
+            self._save()
+
+    def _evict(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self.entries.items(), key=self._rank):
+            if total <= self.max_bytes:
+                break
+            if self.pins[key] > 0:
+                continue
+            path = self.directory.joinpath(entry.filename)
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except FileNotFoundError:
+                del self.entries[key]
+                total -= entry.size
+                continue
+            try:
+                # pinned by another process
+                if not try_lock(fd):
+                    continue
+                path.unlink(missing_ok=True)
+            finally:
+                os.close(fd)
+            # left behind by a process that died while holding the lease
+            self.clear_lease(key)
+            del self.entries[key]
+            total -= entry.size
+
+    def scan(self):
+        with file_lock(self.lock_file), self.mutex:
+            self._scan()
+
+    def _scan(self):
+        entries: dict[str, CacheEntry] = {
+            k: v
+            for k, v in self.read_index().items()
+            if self.directory.joinpath(v.filename).is_file()
+        }
+
+        known = {x.filename: x for x in entries.values()}
+        paths = [x for x in self.directory.iterdir() if x.is_file()]
+        names = {x.name for x in paths}
+        for path in paths:
+            if path.name == INDEX_NAME or path.name.startswith("."):
+                continue
+            if path.name.endswith(PARTIAL_SUFFIXES) or f"{path.name}.part" in names:
+                target = path.name
+                if target.endswith(PARTIAL_SUFFIXES):
+                    target = target.rpartition(".")[0]
+                key = self.key_from_filename(target)
+                # still being written by another process
+                if key is not None and self.leased(key):
+                    continue
+                path.unlink(missing_ok=True)
+                entries = {k: v for k, v in entries.items() if v.filename != path.name}
+                continue
+            if (entry := known.get(path.name)) is not None:
+                entry.size = path.stat().st_size
+                continue
+            if (key := self.key_from_filename(path.name)) is None:
+                continue
+            stat = path.stat()
+            entries[key] = CacheEntry(path.name, stat.st_size, stat.st_mtime)
+
+        self.entries = entries
+        self._evict()
+        self._save()
+
+    def save(self):
+        with file_lock(self.lock_file), self.mutex:
+            self.refresh()
+            self._save()
+
+    def _save(self):
+        data = {"entries": {k: asdict(v) for k, v in self.entries.items()}}
+        tmp = self.index_file.with_name(f"{INDEX_NAME}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, self.index_file)
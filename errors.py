@@ -10,9 +10,21 @@ class AudioExtensionError(AudioSourceNotFoundError):
     pass
 
 
+class AudioSizeError(AudioSourceNotFoundError):
+    pass
+
+
 class AudioUrlError(Exception):
     pass
 
 
 class UserNotInVoiceChannel(Exception):
     pass
+
+
+class DuplicateSongError(Exception):
+    pass
+
+
+class ExtractorUnavailableError(Exception):
+    pass
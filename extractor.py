@@ -0,0 +1,276 @@
+import asyncio
+import importlib.util
+import json
+import logging
+import multiprocessing
+import pickle
+from collections.abc import Callable
+from multiprocessing.connection import Connection
+from multiprocessing.context import ForkServerContext, SpawnContext
+from typing import Any
+
+from errors import AudioSourceNotFoundError, ExtractorUnavailableError
+from scheduler import MAX_DOWNLOADS
+
+EXTRACT_WORKERS = 2
+WORKER_MAX_TASKS = 64
+EXTRACT_TIMEOUT_SEC = 60.0
+DOWNLOAD_TIMEOUT_SEC = 30 * 60.0
+FORMAT = "bestaudio/best"
+BASE_OPTIONS: dict[str, Any] = {
+    "format": FORMAT,
+    "quiet": True,
+    "no_warnings": True,
+    "noplaylist": True,
+    "noprogress": True,
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _warm():
+    import yt_dlp  # noqa: F401
+    from yt_dlp.extractor import gen_extractor_classes
+
+    gen_extractor_classes()
+
+
+def _extract(url: str, options: dict[str, Any]) -> dict[str, Any]:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import YoutubeDLError
+
+    try:
+        with YoutubeDL({**BASE_OPTIONS, **options}) as ydl:
+            info = ydl.extract_info(url, download=False)
+            return ydl.sanitize_info(info)
+    except YoutubeDLError as e:
+        raise AudioSourceNotFoundError(str(e)) from None
+
+
+def _download(url: str, info_file: str | None, options: dict[str, Any]) -> str:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadError, YoutubeDLError
+
+    try:
+        with YoutubeDL({**BASE_OPTIONS, **options}) as ydl:
+            if info_file is None:
+                info = ydl.extract_info(url, download=True)
+            else:
+                with open(info_file) as f:
+                    info = json.load(f)
+                try:
+                    info = ydl.process_ie_result(info, download=True)
+                except DownloadError:
+                    info = ydl.extract_info(url, download=True)
+            return info["requested_downloads"][0]["filepath"]
+    except YoutubeDLError as e:
+        raise AudioSourceNotFoundError(str(e)) from None
+
+
+def _serve(conn: Connection):
+    _warm()
+    conn.send((True, None))
+    while True:
+        try:
+            fn, args = conn.recv()
+        except EOFError:
+            return
+        try:
+            conn.send((True, fn(*args)))
+        except AudioSourceNotFoundError as e:
+            conn.send((False, e))
+        except Exception as e:
+            # a bug rather than a bad url; the traceback does not survive pickling
+            logger.exception("extractor job %s failed", getattr(fn, "__name__", fn))
+            try:
+                conn.send((False, e))
+            except (pickle.PicklingError, AttributeError, TypeError):
+                # the error itself may not pickle
+                conn.send((False, RuntimeError(repr(e))))
+
+
+class WorkerDiedError(Exception):
+    pass
+
+
+class Worker:
+    def __init__(self, context: ForkServerContext | SpawnContext) -> None:
+        # reap workers killed earlier
+        multiprocessing.active_children()
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.fd = self.conn.fileno()
+        self.ready = False
+        self.tasks = 0
+        self.waiter: asyncio.Future[None] | None = None
+
+    async def receive(self):
+        # wait on the loop's selector; a blocked recv would pin an executor thread
+        loop = asyncio.get_running_loop()
+        self.waiter = loop.create_future()
+        loop.add_reader(self.fd, self.wake)
+        try:
+            await self.waiter
+            ok, value = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerDiedError from e
+        finally:
+            self.unwatch()
+        if not ok:
+            raise value
+        return value
+
+    def wake(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    def unwatch(self):
+        if self.waiter is not None:
+            self.waiter.get_loop().remove_reader(self.fd)
+            self.waiter = None
+
+    async def start(self):
+        if not self.ready:
+            await self.receive()
+            self.ready = True
+
+    async def run(self, fn: Callable[..., Any], args: tuple[Any, ...]):
+        try:
+            self.conn.send((fn, args))
+        except OSError as e:
+            raise WorkerDiedError from e
+        self.tasks += 1
+        return await self.receive()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(WorkerDiedError())
+        self.unwatch()
+        self.conn.close()
+
+
+class WorkerPool:
+    def __init__(self, size: int, max_tasks: int = WORKER_MAX_TASKS) -> None:
+        self.size = size
+        self.max_tasks = max_tasks
+        self.idle: list[Worker] = []
+        self.busy: set[Worker] = set()
+        self.semaphore = asyncio.Semaphore(size)
+        methods = multiprocessing.get_all_start_methods()
+        self.context: ForkServerContext | SpawnContext = (
+            multiprocessing.get_context("forkserver")
+            if "forkserver" in methods
+            else multiprocessing.get_context("spawn")
+        )
+
+    def take(self):
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.process.is_alive():
+                return worker
+            worker.kill()
+        return Worker(self.context)
+
+    def give(self, worker: Worker):
+        self.busy.discard(worker)
+        if worker.tasks >= self.max_tasks or not worker.process.is_alive():
+            worker.kill()
+        else:
+            self.idle.append(worker)
+
+    async def call(self, timeout: float, fn: Callable[..., Any], *args: Any):
+        async with self.semaphore:
+            worker = self.take()
+            self.busy.add(worker)
+            try:
+                await worker.start()
+                # the deadline covers only the job itself, not queueing or warmup
+                result = await asyncio.wait_for(worker.run(fn, args), timeout)
+            except TimeoutError:
+                self.busy.discard(worker)
+                worker.kill()
+                raise AudioSourceNotFoundError from None
+            except (asyncio.CancelledError, WorkerDiedError):
+                self.busy.discard(worker)
+                worker.kill()
+                raise
+            except Exception:
+                self.give(worker)
+                raise
+            self.give(worker)
+            return result
+
+    def shutdown(self):
+        for worker in [*self.idle, *self.busy]:
+            worker.kill()
+        self.idle.clear()
+        self.busy.clear()
+
+
+class Extractor:
+    def __init__(
+        self,
+        workers: int = EXTRACT_WORKERS,
+        download_workers: int = MAX_DOWNLOADS,
+        max_tasks: int = WORKER_MAX_TASKS,
+    ):
+        self.workers = workers
+        self.download_workers = download_workers
+        self.max_tasks = max_tasks
+        self._available = importlib.util.find_spec("yt_dlp") is not None
+        self._extract_pool: WorkerPool | None = None
+        self._download_pool: WorkerPool | None = None
+
+    @property
+    def available(self):
+        return self._available
+
+    @property
+    def extract_pool(self) -> WorkerPool:
+        if self._extract_pool is None:
+            self._extract_pool = WorkerPool(self.workers, self.max_tasks)
+        return self._extract_pool
+
+    @property
+    def download_pool(self) -> WorkerPool:
+        if self._download_pool is None:
+            self._download_pool = WorkerPool(self.download_workers, self.max_tasks)
+        return self._download_pool
+
+    async def call(
+        self, pool: WorkerPool, timeout: float, fn: Callable[..., Any], *args: Any
+    ):
+        if not self.available:
+            raise ExtractorUnavailableError
+        for _ in range(2):
+            try:
+                return await pool.call(timeout, fn, *args)
+            except WorkerDiedError:
+                pass
+        raise ExtractorUnavailableError
+
+    async def extract_info(self, url: str, **options: Any) -> dict[str, Any]:
+        return await self.call(
+            self.extract_pool, EXTRACT_TIMEOUT_SEC, _extract, url, options
+        )
+
+    async def download(
+        self, url: str, info_file: str | None = None, **options: Any
+    ) -> str:
+        return await self.call(
+            self.download_pool, DOWNLOAD_TIMEOUT_SEC, _download, url, info_file, options
+        )
+
+    def shutdown(self):
+        for pool in (self._extract_pool, self._download_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._extract_pool = None
+        self._download_pool = None
+
+
+extractor = Extractor()
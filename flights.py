@@ -0,0 +1,83 @@
+import asyncio
+import logging
+from typing import Protocol
+
+from progressive import Buffer
+
+logger = logging.getLogger(__name__)
+
+
+class Shareable(Protocol):
+    buffer: Buffer | None
+
+    def create_task(self) -> asyncio.Task[str]:
+        ...
+
+    def observe(self, task: asyncio.Task[str]) -> None:
+        ...
+
+    def dispose(self, filename: str) -> None:
+        ...
+
+    def unshared(self) -> None:
+        ...
+
+
+class Flight:
+    def __init__(self, key: str, leader: Shareable) -> None:
+        self.key = key
+        self.leader = leader
+        self.refs = 0
+        self.task = leader.create_task()
+        leader.observe(self.task)
+        self.task.add_done_callback(self.settle)
+
+    @property
+    def failed(self):
+        task = self.task
+        return task.done() and (task.cancelled() or task.exception() is not None)
+
+    @property
+    def buffer(self):
+        return self.leader.buffer
+
+    def settle(self, _=None):
+        if self.refs > 0 or not self.task.done() or self.failed:
+            return
+        try:
+            self.leader.dispose(self.task.result())
+        except Exception:
+            logger.exception("failed to dispose %s", self.key)
+
+
+class Flights:
+    def __init__(self) -> None:
+        self.flights: dict[str, Flight] = {}
+
+    def __len__(self):
+        return len(self.flights)
+
+    def join(self, key: str, song: Shareable) -> Flight:
+        flight = self.flights.get(key)
+        if flight is None or flight.failed:
+            flight = self.flights[key] = Flight(key, song)
+        flight.refs += 1
+        return flight
+
+    def release(self, flight: Flight):
+        flight.refs -= 1
+        if flight.refs > 0:
+            return
+        if self.flights.get(flight.key) is flight:
+            del self.flights[flight.key]
+        if flight.task.done():
+            flight.settle()
+        else:
+            flight.task.cancel()
+        try:
+            flight.leader.unshared()
+        except Exception:
+            logger.exception("failed to release %s", flight.key)
+
+
+flights = Flights()
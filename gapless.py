@@ -0,0 +1,77 @@
+import audioop
+from collections import deque
+from collections.abc import Callable
+
+import discord
+
+FRAME_MS = 20
+PREBUFFER_FRAMES = 25
+CROSSFADE_MS = 0
+SAMPLE_WIDTH = 2
+
+
+class BufferedSource(discord.AudioSource):
+    def __init__(self, original: discord.AudioSource, crossfade_ms: int = 0) -> None:
+        self.original = original
+        self.frames: deque[bytes] = deque()
+        self.eof = False
+        self.crossfade = crossfade_ms // FRAME_MS
+        self.next: BufferedSource | None = None
+        self.tail = 0
+        self.faded = 0
+        self.on_start: Callable[[], None] | None = None
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def _pull(self):
+        if self.eof:
+            return
+        if data := self.original.read():
+            self.frames.append(data)
+        else:
+            self.eof = True
+
+    def prime(self, count: int = PREBUFFER_FRAMES):
+        while len(self.frames) < count and not self.eof:
+            self._pull()
+        return self
+
+    def can_crossfade(self):
+        return (
+            self.crossfade > 0
+            and self.next is not None
+            and not self.is_opus()
+            and not self.next.is_opus()
+        )
+
+    def read(self) -> bytes:
+        if self.on_start is not None:
+            on_start, self.on_start = self.on_start, None
+            on_start()
+        if self.can_crossfade():
+            while len(self.frames) <= self.crossfade and not self.eof:
+                self._pull()
+            if self.eof and self.frames:
+                return self._mix(self.frames.popleft())
+        if not self.frames:
+            self._pull()
+        return self.frames.popleft() if self.frames else b""
+
+    def _mix(self, frame: bytes) -> bytes:
+        if self.tail == 0:
+            self.tail = len(self.frames) + 1
+        self.faded += 1
+        fade_in = self.faded / (self.tail + 1)
+        out = audioop.mul(frame, SAMPLE_WIDTH, 1 - fade_in)
+        incoming = self.next.read() if self.next is not None else b""
+        if not incoming:
+            return out
+        incoming = audioop.mul(incoming, SAMPLE_WIDTH, fade_in)
+        size = max(len(out), len(incoming))
+        return audioop.add(
+            out.ljust(size, b"\0"), incoming.ljust(size, b"\0"), SAMPLE_WIDTH
+        )
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
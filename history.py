@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import sqlite3
+import sys
+import time
+from dataclasses import astuple, dataclass
+from pathlib import Path
+
+from errors import AudioSourceNotFoundError
+from song import YtDlpSong
+
+HISTORY_FILE = Path(__file__).resolve().parent.joinpath("history.sqlite3")
+BATCH_SIZE = 64
+FLUSH_DELAY_SEC = 5.0
+WARM_TOP_N = 50
+WARM_WINDOW_SEC = 14 * 24 * 3600
+OFF_PEAK_HOURS = range(3, 7)
+WARM_KINDS = ("youtube:", "soundcloud:")
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plays (
+    id INTEGER PRIMARY KEY,
+    at REAL NOT NULL,
+    guild_id INTEGER NOT NULL,
+    track TEXT,
+    url TEXT,
+    requester INTEGER,
+    event TEXT NOT NULL,
+    listened REAL,
+    duration REAL,
+    resolve_sec REAL,
+    download_sec REAL
+);
+CREATE INDEX IF NOT EXISTS plays_guild_at ON plays (guild_id, at, track);
+CREATE INDEX IF NOT EXISTS plays_at ON plays (at, track);
+"""
+
+
+@dataclass
+class Play:
+    at: float
+    guild_id: int
+    track: str | None
+    url: str | None
+    requester: int | None
+    event: str
+    listened: float | None
+    duration: float | None
+    resolve_sec: float | None
+    download_sec: float | None
+
+
+class History:
+    def __init__(self, file: Path = HISTORY_FILE) -> None:
+        self.file = file
+        self.conn: sqlite3.Connection | None = None
+        self.pending: list[Play] = []
+        self.lock = asyncio.Lock()
+        self.flush_handle: asyncio.TimerHandle | None = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.file, check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+        return self.conn
+
+    def record(self, play: Play):
+        self.pending.append(play)
+        if len(self.pending) >= BATCH_SIZE:
+            asyncio.create_task(self.flush())
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                FLUSH_DELAY_SEC, lambda: asyncio.create_task(self.flush())
+            )
+
+    def _insert(self, plays: list[Play]):
+        conn = self.connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO plays (at, guild_id, track, url, requester, event,"
+                " listened, duration, resolve_sec, download_sec)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [astuple(x) for x in plays],
+            )
+
+    async def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        async with self.lock:
+            if not self.pending:
+                return
+            plays, self.pending = self.pending, []
+            try:
+                await asyncio.to_thread(self._insert, plays)
+            except sqlite3.Error:
+                logger.exception("failed to record %d plays", len(plays))
+
+    def _top(self, guild_id: int | None, since: float, limit: int):
+        conn = self.connect()
+        if guild_id is None:
+            sql = (
+                "SELECT track, MAX(url), COUNT(*) AS n FROM plays"
+                " WHERE at >= ? AND track IS NOT NULL"
+                " GROUP BY track ORDER BY n DESC LIMIT ?"
+            )
+            return conn.execute(sql, (since, limit)).fetchall()
+        sql = (
+            "SELECT track, MAX(url), COUNT(*) AS n FROM plays"
+            " WHERE guild_id = ? AND at >= ? AND track IS NOT NULL"
+            " GROUP BY track ORDER BY n DESC LIMIT ?"
+        )
+        return conn.execute(sql, (guild_id, since, limit)).fetchall()
+
+    async def top(
+        self,
+        limit: int = 10,
+        guild_id: int | None = None,
+        window: float = WARM_WINDOW_SEC,
+    ) -> list[tuple[str, str | None, int]]:
+        async with self.lock:
+            return await asyncio.to_thread(
+                self._top, guild_id, time.time() - window, limit
+            )
+
+    async def close(self):
+        await self.flush()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+@dataclass
+class WarmSong(YtDlpSong):
+    @property
+    def guild_id(self) -> int:
+        return 0
+
+    def distance(self) -> int:
+        return sys.maxsize
+
+
+class Warmer:
+    def __init__(self, history: History) -> None:
+        self.history = history
+        self.songs: dict[str, WarmSong] = {}
+
+    def off_peak(self):
+        return time.localtime().tm_hour in OFF_PEAK_HOURS
+
+    async def warm(self, limit: int = WARM_TOP_N):
+        hot = {
+            track: url
+            for track, url, _ in await self.history.top(limit)
+            if url is not None and track.startswith(WARM_KINDS)
+        }
+        for track in [x for x in self.songs if x not in hot]:
+            self.songs.pop(track).after()
+        for track, url in hot.items():
+            if track in self.songs:
+                continue
+            song = WarmSong(None, url)  # type: ignore
+            self.songs[track] = song
+            try:
+                await song.materialize()
+            except AudioSourceNotFoundError:
+                logger.info("%s is gone, not warming it", url)
+                self.songs.pop(track).after()
+            except Exception:
+                logger.exception("failed to warm %s", url)
+                self.songs.pop(track).after()
+
+    def release(self):
+        for song in self.songs.values():
+            song.after()
+        self.songs.clear()
+
+
+history = History()
+warmer = Warmer(history)
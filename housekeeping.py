@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import math
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass
+
+TICK_SEC = 1.0
+WHEEL_SIZE = 512
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Timer:
+    key: Hashable
+    callback: Callable[[], None]
+    rounds: int
+    slot: int
+
+
+class TimerWheel:
+    def __init__(self, tick: float = TICK_SEC, size: int = WHEEL_SIZE) -> None:
+        self.tick = tick
+        self.size = size
+        self.slots: list[dict[Hashable, Timer]] = [{} for _ in range(size)]
+        self.timers: dict[Hashable, Timer] = {}
+        self.cursor = 0
+        self.next_at = 0.0
+        self.handle: asyncio.TimerHandle | None = None
+
+    def __contains__(self, key: Hashable):
+        return key in self.timers
+
+    def __len__(self):
+        return len(self.timers)
+
+    def schedule(self, key: Hashable, delay: float, callback: Callable[[], None]):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.cursor + ticks) % self.size
+        timer = Timer(key, callback, (ticks - 1) // self.size, slot)
+        self.slots[slot][key] = timer
+        self.timers[key] = timer
+        self.arm()
+
+    def cancel(self, key: Hashable):
+        if (timer := self.timers.pop(key, None)) is not None:
+            del self.slots[timer.slot][key]
+
+    def arm(self):
+        if self.handle is not None or not self.timers:
+            return
+        loop = asyncio.get_running_loop()
+        self.next_at = max(self.next_at, loop.time()) + self.tick
+        self.handle = loop.call_at(self.next_at, self.advance)
+
+    def advance(self):
+        self.handle = None
+        self.cursor = (self.cursor + 1) % self.size
+        slot = self.slots[self.cursor]
+        expired: list[Timer] = []
+        for timer in list(slot.values()):
+            if timer.rounds > 0:
+                timer.rounds -= 1
+                continue
+            del slot[timer.key]
+            del self.timers[timer.key]
+            expired.append(timer)
+        for timer in expired:
+            try:
+                timer.callback()
+            except Exception:
+                logger.exception("housekeeping timer %r failed", timer.key)
+        self.arm()
+
+
+housekeeper = TimerWheel()
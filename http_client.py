@@ -0,0 +1,46 @@
+import aiohttp
+
+HTTP_LIMIT = 100
+HTTP_LIMIT_PER_HOST = 8
+DNS_CACHE_TTL_SEC = 300
+KEEPALIVE_SEC = 30.0
+CONNECT_TIMEOUT_SEC = 10.0
+READ_TIMEOUT_SEC = 30.0
+
+
+class HttpClient:
+    def __init__(
+        self,
+        limit: int = HTTP_LIMIT,
+        limit_per_host: int = HTTP_LIMIT_PER_HOST,
+        connect_timeout: float = CONNECT_TIMEOUT_SEC,
+        read_timeout: float = READ_TIMEOUT_SEC,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=DNS_CACHE_TTL_SEC,
+                keepalive_timeout=KEEPALIVE_SEC,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+        return self._session
+
+    def get(self, url: str, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
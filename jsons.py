@@ -1,10 +1,17 @@
+import asyncio
 import json
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import TypedDict
 
 import aiofiles
 
+from shards import WORKERS, file_lock, is_primary, worker_of, worker_path
+
+FLUSH_DELAY_SEC = 1.0
+COMPACT_ENTRIES = 1000
+
 
 class Options(TypedDict):
     prefix: str | None
@@ -16,34 +23,166 @@ class Options(TypedDict):
     displaylists: bool
 
 
+def default_options() -> Options:
+    return Options(
+        prefix=None,
+        dj_id=None,
+        blacklist=[],
+        announcesongs=False,
+        preventduplicates=False,
+        maxqueuelength=0,
+        displaylists=False,
+    )
+
+
+def _replace(path: Path, context: str):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        f.write(context)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _merge(path: Path, changes: dict[str, "Options | None"], drop: list[Path]):
+    with file_lock(path.with_name(path.name + ".lock")):
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            data = {}
+        for guild_id, options in changes.items():
+            if options is None:
+                data.pop(guild_id, None)
+            else:
+                data[guild_id] = options
+        _replace(path, json.dumps(data))
+        for journal in drop:
+            journal.unlink(missing_ok=True)
+    return data
+
+
 @dataclass
 class Jsons:
     data: dict[str, Options] = field(default_factory=dict, init=False)
     file: Path
+    dirty: set[str] = field(default_factory=set, init=False)
+    journal_entries: int = field(default=0, init=False)
+    flush_handle: asyncio.TimerHandle | None = field(default=None, init=False)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False)
+    owned: set[str] = field(default_factory=set, init=False)
+    orphans: list[Path] = field(default_factory=list, init=False)
+
+    @property
+    def journal(self):
+        return worker_path(self.file.with_name(self.file.name + ".journal"))
+
+    def journals(self):
+        base = self.file.name + ".journal"
+        return sorted(
+            x
+            for x in self.file.parent.glob(base + "*")
+            if x.name == base or worker_of(x) is not None
+        )
+
+    def orphaned(self, journal: Path):
+        worker = worker_of(journal)
+        return is_primary() and (worker is None or worker >= WORKERS)
+
+    async def replay(self, journal: Path, own: bool):
+        async with aiofiles.open(journal) as f:
+            async for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                self.apply(entry["guild"], entry["options"])
+                if own:
+                    self.owned.add(entry["guild"])
+                    self.journal_entries += 1
 
     async def read(self):
-        if not self.file.is_file():
-            self.data = {}
-        async with aiofiles.open(self.file) as f:
-            self.data = json.loads(await f.read())
+        self.data = {}
+        if self.file.is_file():
+            async with aiofiles.open(self.file) as f:
+                self.data = json.loads(await f.read())
+        for journal in self.journals():
+            if journal == self.journal:
+                await self.replay(journal, True)
+            elif self.orphaned(journal):
+                await self.replay(journal, True)
+                self.orphans.append(journal)
+            else:
+                await self.replay(journal, False)
+        if self.journal_entries:
+            await self.compact()
+
+    def apply(self, guild_id: str, options: Options | None):
+        if options is None:
+            self.data.pop(guild_id, None)
+        else:
+            self.data[guild_id] = options
 
     async def write(self):
-        context = json.dumps(self.data)
-        async with aiofiles.open("data.json", "w") as f:
-            await f.write(context)
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        await self.flush()
+        await self.compact()
+
+    async def flush(self):
+        async with self.lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, set()
+            context = "".join(
+                json.dumps({"guild": x, "options": self.data.get(x)}) + "\n"
+                for x in dirty
+            )
+            async with aiofiles.open(self.journal, "a") as f:
+                await f.write(context)
+            self.journal_entries += len(dirty)
+            self.owned |= dirty
+        if self.journal_entries >= COMPACT_ENTRIES:
+            await self.compact()
+
+    async def compact(self):
+        async with self.lock:
+            changes = {x: self.data.get(x) for x in self.owned}
+            drop = [self.journal, *self.orphans]
+            data = await asyncio.to_thread(_merge, self.file, changes, drop)
+            for guild_id in self.dirty:
+                data.pop(guild_id, None)
+                if (options := self.data.get(guild_id)) is not None:
+                    data[guild_id] = options
+            self.data = data
+            self.owned.clear()
+            self.orphans.clear()
+            self.journal_entries = 0
+
+    def schedule_flush(self):
+        if self.flush_handle is not None:
+            return
+
+        def fire():
+            self.flush_handle = None
+            asyncio.create_task(self.flush())
+
+        self.flush_handle = asyncio.get_running_loop().call_later(
+            FLUSH_DELAY_SEC, fire
+        )
 
     def get_option(self, guild_id: int) -> Options:
         data = self.data.get(str(guild_id))
         if data is not None:
             return data
-        data = Options(
-            prefix=None,
-            dj_id=None,
-            blacklist=[],
-            announcesongs=False,
-            preventduplicates=False,
-            maxqueuelength=0,
-            displaylists=False,
-        )
-        self.data[str(guild_id)] = data
+        return default_options()
+
+    def update_option(self, guild_id: int, **changes) -> Options:
+        data = Options(**{**self.get_option(guild_id), **changes})  # type: ignore
+        if data == default_options():
+            self.data.pop(str(guild_id), None)
+        else:
+            self.data[str(guild_id)] = data
+        self.dirty.add(str(guild_id))
+        self.schedule_flush()
         return data
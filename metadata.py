@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, TypedDict
+
+from cache import DownloadCache
+from shards import file_lock
+
+METADATA_TTL_SEC = 7 * 24 * 60 * 60
+# expired entries are still served for tracks whose file is already cached
+METADATA_STALE_SEC = 30 * 24 * 60 * 60
+
+
+class Metadata(TypedDict):
+    key: str
+    id: str
+    extractor: str
+    title: str | None
+    duration: float | None
+    thumbnail: str | None
+    ext: str | None
+    expires: float
+
+
+class MetadataCache:
+    def __init__(
+        self,
+        file: Path,
+        ttl: float = METADATA_TTL_SEC,
+        stale: float = METADATA_STALE_SEC,
+    ) -> None:
+        self.file = file
+        self.ttl = ttl
+        self.stale = stale
+        self.mutex = threading.Lock()
+        try:
+            self.data: dict[str, Metadata] = json.loads(file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.data = {}
+        self.purge()
+
+    def get(self, url: str, stale: bool = False) -> Metadata | None:
+        meta = self.data.get(url)
+        if meta is None:
+            return None
+        if not stale and meta["expires"] < time.time():
+            return None
+        return meta
+
+    def put(self, url: str, info: dict[str, Any]) -> Metadata:
+        extractor = info["extractor_key"]
+        meta = Metadata(
+            key=DownloadCache.make_key(extractor, info["id"]),
+            id=info["id"],
+            extractor=extractor,
+            title=info.get("title"),
+            duration=info.get("duration"),
+            thumbnail=info.get("thumbnail"),
+            ext=info.get("ext"),
+            expires=time.time() + self.ttl,
+        )
+        with self.mutex:
+            self.data[url] = meta
+        return meta
+
+    def live(self, data: dict[str, Metadata]):
+        limit = time.time() - self.stale
+        return {k: v for k, v in data.items() if v["expires"] >= limit}
+
+    def purge(self):
+        self.data = self.live(self.data)
+
+    def save(self):
+        with file_lock(self.file.with_name(self.file.name + ".lock")):
+            try:
+                data: dict[str, Metadata] = json.loads(self.file.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                data = {}
+            with self.mutex:
+                self.data = self.live({**data, **self.data})
+                context = json.dumps(self.data)
+            tmp = self.file.with_name(f"{self.file.name}.{os.getpid()}.tmp")
+            tmp.write_text(context)
+            os.replace(tmp, self.file)
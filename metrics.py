@@ -0,0 +1,239 @@
+import os
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from aiohttp import web
+
+from shards import worker_index
+
+METRICS_HOST = os.environ.get("PLAY_SOUND_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("PLAY_SOUND_METRICS_PORT", "9464"))
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(float(2**x) for x in range(16, 31, 2))
+DEPTH_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+GAP_BUCKETS = (0.0, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+def _labels(labels: dict[str, str]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format(name: str, labels: Labels, value: float):
+    if labels:
+        inner = ",".join(f'{k}="{v}"' for k, v in labels)
+        return f"{name}{{{inner}}} {value}"
+    return f"{name} {value}"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.values: dict[Labels, float] = {}
+
+    def samples(self):
+        return [_format(self.name, k, v) for k, v in self.values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str):
+        self.values[_labels(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]) -> None:
+        super().__init__(name, help)
+        self.buckets = buckets
+        self.counts: dict[Labels, list[int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        if (counts := self.counts.get(key)) is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        lines = []
+        for key, counts in self.counts.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                total += count
+                le = (("le", str(bound)),)
+                lines.append(_format(f"{self.name}_bucket", key + le, total))
+            lines.append(_format(f"{self.name}_sum", key, self.values[key]))
+            lines.append(_format(f"{self.name}_count", key, total))
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+        self.collectors: list[Callable[[], Awaitable[None]]] = []
+
+    def counter(self, name: str, help: str):
+        self.metrics.append(metric := Counter(name, help))
+        return metric
+
+    def gauge(self, name: str, help: str):
+        self.metrics.append(metric := Gauge(name, help))
+        return metric
+
+    def histogram(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.metrics.append(metric := Histogram(name, help, buckets))
+        return metric
+
+    def collector(self, fn: Callable[[], Awaitable[None]]):
+        self.collectors.append(fn)
+        return fn
+
+    def unregister(self, fn: Callable[[], Awaitable[None]]):
+        if fn in self.collectors:
+            self.collectors.remove(fn)
+
+    async def render(self) -> str:
+        for fn in self.collectors:
+            await fn()
+        return "\n".join(x.render() for x in self.metrics) + "\n"
+
+
+def directory_bytes(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def ffmpeg_children() -> int:
+    pid = str(os.getpid())
+    count = 0
+    try:
+        procs = os.listdir("/proc")
+    except FileNotFoundError:
+        return 0
+    for name in procs:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        comm, _, rest = stat.partition("(")[2].rpartition(")")
+        if comm == "ffmpeg" and rest.split()[1] == pid:
+            count += 1
+    return count
+
+
+class MetricsServer:
+    def __init__(
+        self, registry: "Registry", host: str = METRICS_HOST, port: int = METRICS_PORT
+    ) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port + worker_index() if port > 0 else port
+        self.runner: web.AppRunner | None = None
+
+    async def handle(self, _: web.Request):
+        return web.Response(
+            text=await self.registry.render(),
+            content_type="text/plain",
+            charset="utf-8",
+            headers={"X-Content-Type-Options": "nosniff"},
+        )
+
+    async def start(self):
+        if self.port <= 0 or self.runner is not None:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+registry = Registry()
+players = registry.gauge("play_sound_players", "Connected players")
+queue_depth = registry.gauge(
+    "play_sound_queue_depth_players",
+    "Players whose queue depth is at most le",
+)
+queue_depth_max = registry.gauge("play_sound_queue_depth_max", "Deepest queue")
+queued_songs = registry.gauge("play_sound_queued_songs", "Songs queued in total")
+downloads_in_flight = registry.gauge(
+    "play_sound_downloads_in_flight", "Downloads currently running"
+)
+downloads = registry.counter(
+    "play_sound_downloads_total", "Finished downloads by song type and result"
+)
+downloads_coalesced = registry.counter(
+    "play_sound_downloads_coalesced_total",
+    "Requests that joined a download already in flight",
+)
+download_bytes = registry.histogram(
+    "play_sound_download_bytes", "Size of downloaded files", BYTES_BUCKETS
+)
+download_seconds = registry.histogram(
+    "play_sound_download_seconds", "Wall time of downloads", LATENCY_BUCKETS
+)
+source_open_seconds = registry.histogram(
+    "play_sound_source_open_seconds",
+    "Time from dequeue to an audio source ready to play",
+    LATENCY_BUCKETS,
+)
+playback_gap_seconds = registry.histogram(
+    "play_sound_playback_gap_seconds",
+    "Silence between the end of one song and the start of the next",
+    GAP_BUCKETS,
+)
+cache_lookups = registry.counter(
+    "play_sound_cache_lookups_total", "Download and metadata cache lookups"
+)
+temp_bytes = registry.gauge("play_sound_temp_bytes", "Disk used by the temp dir")
+ffmpeg_processes = registry.gauge(
+    "play_sound_ffmpeg_processes", "Live ffmpeg child processes"
+)
@@ -0,0 +1,88 @@
+import asyncio
+import mmap
+import os
+import struct
+import subprocess
+from pathlib import Path
+
+import discord
+from discord.oggparse import OggStream
+
+MAGIC = b"OPKT"
+FRAME = struct.Struct("<H")
+BITRATE = 128
+OPUS_HEADERS = (b"OpusHead", b"OpusTags")
+
+
+def _encode(source: str, target: Path):
+    cmd = [
+        "ffmpeg",
+        "-nostdin",
+        "-loglevel",
+        "error",
+        "-i",
+        source,
+        "-map_metadata",
+        "-1",
+        "-vn",
+        "-c:a",
+        "libopus",
+        "-ar",
+        "48000",
+        "-ac",
+        "2",
+        "-b:a",
+        f"{BITRATE}k",
+        "-frame_duration",
+        "20",
+        "-application",
+        "audio",
+        "-f",
+        "opus",
+        "pipe:1",
+    ]
+    tmp = target.with_name(target.name + ".tmp")
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+        assert proc.stdout is not None
+        with open(tmp, "wb") as out:
+            out.write(MAGIC)
+            for packet in OggStream(proc.stdout).iter_packets():  # type: ignore
+                if packet.startswith(OPUS_HEADERS):
+                    continue
+                out.write(FRAME.pack(len(packet)))
+                out.write(packet)
+    if proc.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"ffmpeg exited with {proc.returncode}")
+    os.replace(tmp, target)
+    return target
+
+
+async def ingest(source: str, target: Path) -> Path:
+    return await asyncio.to_thread(_encode, source, target)
+
+
+class OpusPacketSource(discord.AudioSource):
+    def __init__(self, path: Path) -> None:
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[: len(MAGIC)] != MAGIC:
+            self.cleanup()
+            raise ValueError(f"{path} is not an opus packet file")
+        self.offset = len(MAGIC)
+
+    def read(self) -> bytes:
+        start = self.offset + FRAME.size
+        if start > len(self.map):
+            return b""
+        (size,) = FRAME.unpack_from(self.map, self.offset)
+        self.offset = start + size
+        return self.map[start : self.offset]
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        if not self.map.closed:
+            self.map.close()
+        self.file.close()
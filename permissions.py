@@ -0,0 +1,46 @@
+from dataclasses import dataclass
+
+import discord
+
+from jsons import Jsons
+
+
+@dataclass(frozen=True)
+class Decision:
+    dj: bool
+    mod: bool
+    roles: frozenset[int]
+
+
+class PermissionCache:
+    def __init__(self) -> None:
+        self.guilds: dict[int, dict[int, Decision]] = {}
+
+    def get(self, member: discord.Member, data: Jsons) -> Decision:
+        members = self.guilds.setdefault(member.guild.id, {})
+        if (decision := members.get(member.id)) is not None:
+            return decision
+        dj_id = data.get_option(member.guild.id)["dj_id"]
+        decision = Decision(
+            dj=dj_id is None or member.get_role(dj_id) is not None,
+            mod=member.guild_permissions.manage_roles,
+            roles=frozenset(x.id for x in member.roles),
+        )
+        members[member.id] = decision
+        return decision
+
+    def invalidate_member(self, guild_id: int, member_id: int):
+        if (members := self.guilds.get(guild_id)) is not None:
+            members.pop(member_id, None)
+
+    def invalidate_role(self, guild_id: int, role_id: int):
+        if (members := self.guilds.get(guild_id)) is None:
+            return
+        for member_id in [k for k, v in members.items() if role_id in v.roles]:
+            del members[member_id]
+
+    def invalidate_guild(self, guild_id: int):
+        self.guilds.pop(guild_id, None)
+
+
+permissions = PermissionCache()
@@ -1,5 +1,5 @@
+import asyncio
 import logging
-import re
 import typing
 from pathlib import Path
 
@@ -7,12 +7,42 @@ import discord
 from discord.ext import commands, tasks
 
 import checks
-from errors import AudioSourceNotFoundError, AudioUrlError, UserNotInVoiceChannel
+from errors import (
+    AudioSourceNotFoundError,
+    AudioUrlError,
+    DuplicateSongError,
+    UserNotInVoiceChannel,
+)
+from extractor import extractor
+from history import history, warmer
+from housekeeping import housekeeper
+from http_client import HttpClient
 from jsons import Jsons
+from metrics import (
+    DEPTH_BUCKETS,
+    MetricsServer,
+    directory_bytes,
+    ffmpeg_children,
+    ffmpeg_processes,
+    players,
+    queue_depth,
+    queue_depth_max,
+    queued_songs,
+    registry,
+    temp_bytes,
+)
+from permissions import permissions
 from player import Player
-from song import DiscordMessageLinkSong, OnlineSong, Song, YoutubeSong, YtDlpSong
+from queue_view import QueueView, format_duration
+from resolvers import Env, Match, resolvers
+from shards import is_primary
+from snapshot import SnapshotStore, load_song
+from song import Song, tempdir
+from tracing import tracer
 
 PERMISSIONS = 3263552
+ALONE_TIMEOUT_SEC = 60
+REAP_SEC = 300
 json_path = Path(__file__).resolve().parent.joinpath("data.json")
 
 
@@ -20,82 +50,184 @@ class PlaySound(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot: commands.Bot = bot
         self.players: dict[int, Player] = dict()
-        self.delete_disconnected.start()
+        self.http = HttpClient()
+        self.env = Env(self.http, bot)
+        self.warm_cache.start()
+        self.snapshots = SnapshotStore()
+        self.metrics = MetricsServer(registry)
+        self.save_snapshots.start()
 
     async def cog_load(self):
         self.data = Jsons(json_path)
         await self.data.read()
+        registry.collector(self.collect_metrics)
+        await self.metrics.start()
 
     async def cog_unload(self):
-        self.delete_disconnected.cancel()
+        registry.unregister(self.collect_metrics)
+        await self.metrics.stop()
+        self.warm_cache.cancel()
+        self.save_snapshots.cancel()
+        self.snapshots.capture(self.players)
+        self.snapshots.save()
+        # release the voice connections so a reloaded cog can connect again
+        players, self.players = self.players, {}
+        for guild_id, player in players.items():
+            housekeeper.cancel(("alone", guild_id))
+            housekeeper.cancel(("reap", guild_id))
+            player.on_disconnect = None
+            player.close()
+            if not player.disconnected:
+                await player.voice_client.disconnect(force=True)
+        warmer.release()
+        await history.close()
+        await self.http.close()
+        extractor.shutdown()
+        tracer.close()
         await self.data.write()
 
-    def get_song(self, url: str, author: discord.Member) -> Song:
-        if not re.match(r"https?://[\w!?/+\-_~;.,*&@#$%()'[\]]+", url):
-            raise AudioSourceNotFoundError
-
-        if re.match(r"https://discord\.com/channels/[0-9]+/[0-9]+/[0-9]+", url):
-            return DiscordMessageLinkSong(author, url, self.bot)
-
-        if (
-            re.match(
-                r"https?://(?:www|music|m)\.(?:youtube\.com|youtu\.be)/(?:watch\?v=|embed)?[a-zA-Z0-9_\-]+",  # noqa
-                url,
-            )
-            or re.match(r"https?//soundcloud.com/\w+/\w+", url)
-            or re.match(r"https?://youtu.be/[a-zA-Z0-9_\-]+", url)
-        ):
-            return YoutubeSong(author, url)
-
-        return OnlineSong(author, url)
-
-    def check_url(self, url: str, author: discord.Member):
-        if not (
-            re.match(
-                r"https?://(?:www|music|m)\.youtube\.com/(?:watch\?v=|embed/|shorts/)[a-zA-Z0-9_\-]+",  # noqa
-                url,
-            )
-            or re.match(r"https?://soundcloud.com/[a-zA-Z0-9_\-]+/[a-zA-Z0-9_\-]+", url)
-            or re.match(r"https?://youtu.be/[a-zA-Z0-9_\-]+", url)
-        ):
+    def make_song(self, match: Match, author: discord.Member) -> Song:
+        if match.playlist:
             raise AudioUrlError
-        # if url is None:
-        #     song = DiscordMessageSong(ctx.message)
-        # else:
-        #     # song = self.get_song(url)
-        return YtDlpSong(author, url)
+        return match.build(author, self.env)
+
+    def check_duplicate(self, guild_id: int, player: Player, key: str):
+        if not self.data.get_option(guild_id)["preventduplicates"]:
+            return
+        if player.has_key(key):
+            raise DuplicateSongError
+
+    def drop_duplicates(self, guild_id: int, player: Player, songs: list[Song]):
+        if not self.data.get_option(guild_id)["preventduplicates"]:
+            return songs
+        seen: set[str] = set()
+        kept: list[Song] = []
+        for x in songs:
+            if x.key is not None:
+                if x.key in seen or player.has_key(x.key):
+                    continue
+                seen.add(x.key)
+            kept.append(x)
+        return kept
+
+    async def collect_metrics(self):
+        depths = [len(x.queue) for x in self.players.values() if not x.disconnected]
+        players.set(len(depths))
+        queued_songs.set(sum(depths))
+        queue_depth_max.set(max(depths, default=0))
+        for bound in DEPTH_BUCKETS:
+            queue_depth.set(sum(x <= bound for x in depths), le=str(bound))
+        queue_depth.set(len(depths), le="+Inf")
+        temp_bytes.set(await asyncio.to_thread(directory_bytes, tempdir.tempdir))
+        ffmpeg_processes.set(await asyncio.to_thread(ffmpeg_children))
 
     def get_player(self, guild_id: int):
         player = self.players.get(guild_id)
         return player if player is not None and not player.disconnected else None
 
+    async def make_player(self, guild_id: int, author: discord.Member):
+        if (voice := author.voice) is None or (channel := voice.channel) is None:
+            raise UserNotInVoiceChannel
+        guild = author.guild
+        voice_client = typing.cast(discord.VoiceClient | None, guild.voice_client)
+        if voice_client is not None and not voice_client.is_connected():
+            await voice_client.disconnect(force=True)
+            voice_client = None
+        if voice_client is None:
+            voice_client = await channel.connect()
+        plyer = Player(voice_client, self.bot.loop)
+        self.players[guild_id] = plyer
+        plyer.on_disconnect = lambda: self.drop_player(guild_id)
+        housekeeper.schedule(("reap", guild_id), REAP_SEC, lambda: self.reap(guild_id))
+        self.restore(plyer, author)
+        return plyer
+
     async def get_player_or_make(self, guild_id: int, author: discord.Member):
         if (plyer := self.get_player(guild_id)) is None:
-            try:
-                plyer = Player(await author.voice.channel.connect(), self.bot.loop)  # type: ignore
-                self.players[guild_id] = plyer
-            except AttributeError:
-                raise UserNotInVoiceChannel
+            plyer = await self.make_player(guild_id, author)
         return plyer
 
-    @commands.hybrid_command(aliases=["p"])
-    @commands.guild_only()
-    async def play(self, ctx: commands.Context, url: str):
+    def drop_player(self, guild_id: int):
+        housekeeper.cancel(("alone", guild_id))
+        housekeeper.cancel(("reap", guild_id))
+        if (player := self.players.pop(guild_id, None)) is None:
+            return
+        # a torn down player was left on purpose; only unload keeps queues
+        self.snapshots.discard(guild_id)
+        player.close()
+
+    def reap(self, guild_id: int):
+        if (player := self.players.get(guild_id)) is None:
+            return
+        if player.disconnected:
+            self.drop_player(guild_id)
+            return
+        housekeeper.schedule(("reap", guild_id), REAP_SEC, lambda: self.reap(guild_id))
+
+    def leave_if_alone(self, guild_id: int):
+        if (player := self.get_player(guild_id)) is None:
+            return
+        if any(not x.bot for x in player.voice_client.channel.members):
+            return
+        asyncio.create_task(player.disconnect())
+
+    def restore(self, player: Player, author: discord.Member):
+        if (state := self.snapshots.pop(author.guild.id)) is None:
+            return
+        songs = [
+            load_song(
+                x,
+                author.guild.get_member(x["author"]) or author,
+                self.http,
+                self.bot,
+            )
+            for x in state["songs"]
+        ]
+        player.loop_queue = state["loop_queue"]
+        player.loop_song = state["loop_song"]
+        player.add_many(songs)
+
+    async def enqueue(self, ctx: commands.Context, url: str, first: bool = False):
         guild = typing.cast(discord.Guild, ctx.guild)
         author = typing.cast(discord.Member, ctx.author)
         try:
+            match = resolvers.resolve(url)
             player = await self.get_player_or_make(guild.id, author)
-            song = self.check_url(url, author)
-            player.add(song)
+            player.text_channel = ctx.channel
+            if match.playlist:
+                await ctx.defer()
+                songs = await match.expand(author, self.env)
+                songs = self.drop_duplicates(guild.id, player, songs)
+                if first:
+                    player.add_many_first(songs)
+                else:
+                    player.add_many(songs)
+                await ctx.send(f"Added {len(songs)} songs to queue")
+                return
+            self.check_duplicate(guild.id, player, match.key)
+            song = self.make_song(match, author)
+            if first:
+                player.add_first(song)
+            else:
+                player.add(song)
             if len(player.queue) > 0:
                 await ctx.send("Added to queue")
             else:
                 await ctx.send("playing")
+        except AudioUrlError:
+            await ctx.send("そのURLは無理やで")
         except AudioSourceNotFoundError:
             await ctx.send("ないよ")
+        except DuplicateSongError:
+            await ctx.send("もう入ってるで")
         except UserNotInVoiceChannel:
             await ctx.send("VC入れや")
 
+    @commands.hybrid_command(aliases=["p"])
+    @commands.guild_only()
+    async def play(self, ctx: commands.Context, url: str):
+        await self.enqueue(ctx, url)
+
     @commands.hybrid_command(aliases=["summon", "fuckon"])
     @commands.guild_only()
     async def join(self, ctx: commands.Context) -> None:
@@ -106,11 +238,12 @@ class PlaySound(commands.Cog):
             return
 
         author = typing.cast(discord.Member, ctx.author)
-        if (voice := author.voice) is None or (channel := voice.channel) is None:
+        try:
+            player = await self.make_player(guild.id, author)
+        except UserNotInVoiceChannel:
             await ctx.send("vc入れや")
             return
-
-        self.players[guild.id] = Player(await channel.connect(), self.bot.loop)
+        player.text_channel = ctx.channel
         await ctx.send("やあ")
 
     @commands.hybrid_command(aliases=["dis", "dc", "leave", "fuckoff"])
@@ -142,32 +275,11 @@ class PlaySound(commands.Cog):
             await ctx.send("おらんで")
             return
 
-        if (now_play := player.now_play) is None:
+        if player.now_play is None:
             await ctx.send("empty")
             return
-        queue = player.get_queue()
-        embed = discord.Embed(
-            title=f"Queue of {guild.name}",
-        )
-        embed.add_field(
-            name="",
-            value="__Play now:__\n" + f"[{now_play.title}]({now_play.url})"  # type: ignore
-            if hasattr(now_play, "url")
-            else now_play.title,
-        )
-        embed.add_field(
-            name="",
-            value="__Next up:__\n"
-            + "\n".join(
-                [
-                    f"`{i + 1}.` [{x}]({x.url}) | `Requested by {x.author}`"  # type: ignore
-                    for i, x in enumerate(queue)
-                    if hasattr(x, "url")
-                ]
-            ),
-            inline=False,
-        )
-        await ctx.send(embed=embed)
+        view = QueueView(player, f"Queue of {guild.name}")
+        view.message = await ctx.send(embed=view.embed(), view=view)
 
     @commands.hybrid_command(aliases=["np"])
     @commands.guild_only()
@@ -181,14 +293,16 @@ class PlaySound(commands.Cog):
             await ctx.send("再生してないよ")
             return
 
-        await ctx.send(
-            embed=discord.Embed(
-                title="Now Playing",
-                description=f"[{now_play.title}]({now_play.url})"  # type: ignore
-                if hasattr(now_play, "url")
-                else now_play.title,
-            )
+        embed = discord.Embed(
+            title="Now Playing",
+            description=f"[{now_play}]({now_play.url})"  # type: ignore
+            if hasattr(now_play, "url")
+            else str(now_play),
         )
+        embed.add_field(name="", value=f"`{format_duration(now_play)}`")
+        if now_play.thumbnail is not None:
+            embed.set_thumbnail(url=now_play.thumbnail)
+        await ctx.send(embed=embed)
 
     @commands.hybrid_command()
     @commands.guild_only()
@@ -263,20 +377,7 @@ class PlaySound(commands.Cog):
     @commands.guild_only()
     @checks.is_dj()
     async def playtop(self, ctx: commands.Context, url: str):
-        guild = typing.cast(discord.Guild, ctx.guild)
-        author = typing.cast(discord.Member, ctx.author)
-        try:
-            player = await self.get_player_or_make(guild.id, author)
-            song = self.check_url(url, author)
-            player.add_first(song)
-            if len(player.queue) > 0:
-                await ctx.send("Added to queue")
-            else:
-                await ctx.send("playing")
-        except AudioSourceNotFoundError:
-            await ctx.send("ないよ")
-        except UserNotInVoiceChannel:
-            await ctx.send("VC入れや")
+        await self.enqueue(ctx, url, first=True)
 
     @commands.hybrid_command(aliases=["ps", "pskip", "playnow", "pn"])
     @commands.guild_only()
@@ -290,6 +391,43 @@ class PlaySound(commands.Cog):
         player.skip()
         await ctx.send("playing")
 
+    @commands.hybrid_command()
+    @commands.guild_only()
+    @checks.is_mod()
+    async def trace(self, ctx: commands.Context, count: int = 5):
+        guild = typing.cast(discord.Guild, ctx.guild)
+        records = tracer.ring.query(guild.id, min(max(count, 1), 20))
+        if not records:
+            await ctx.send("まだないで")
+            return
+        embed = discord.Embed(title="Song traces")
+        for record in records:
+            events = " → ".join(
+                f"{x['event']} {x['ms']:.0f}ms"
+                + (f" ({x['bytes'] // 1024}KiB)" if x.get("bytes") else "")
+                for x in record["events"]
+            )
+            embed.add_field(
+                name=f"{record['title'] or 'unknown'} [{record['kind']}]"[:256],
+                value=events[:1024],
+                inline=False,
+            )
+        await ctx.send(embed=embed)
+
+    @commands.hybrid_command(aliases=["cf"])
+    @commands.guild_only()
+    @checks.is_dj()
+    async def crossfade(self, ctx: commands.Context, seconds: float):
+        guild = typing.cast(discord.Guild, ctx.guild)
+        if (player := self.get_player(guild.id)) is None:
+            await ctx.send("おらんで")
+            return
+        if not 0 <= seconds <= 12:
+            await ctx.send("0~12秒で")
+            return
+        player.set_crossfade(int(seconds * 1000))
+        await ctx.send(f"crossfade {seconds}s")
+
     @commands.hybrid_command(aliases=["cl"])
     @commands.guild_only()
     async def clear(self, ctx: commands.Context):
@@ -361,16 +499,20 @@ class PlaySound(commands.Cog):
         if (player := self.get_player(guild.id)) is None:
             await ctx.send("おらんで")
             return
-        in_q = []
-        rev_list: list[int] = []
-        for i, x in enumerate(player.get_queue()):
-            if x.id in in_q:
-                rev_list.append(i)
-            else:
-                in_q.append(x.id)
+        in_q: set[str] = set()
+
+        if player.now_play is not None and player.now_play.key is not None:
+            in_q.add(player.now_play.key)
 
-        for x in reversed(rev_list):
-            player.queue.remove_index(x)
+        def is_dupe(x: Song):
+            if x.key is None:
+                return False
+            if x.key in in_q:
+                return True
+            in_q.add(x.key)
+            return False
+
+        player.remove_where(is_dupe)
 
         await ctx.send("done")
 
@@ -385,10 +527,7 @@ class PlaySound(commands.Cog):
         if len(player.queue) <= target:
             await ctx.send("なくなる")
             return
-        for _ in range(target - 1):
-            await player.queue.get()
-
-        player.skip()
+        player.skip_to(target)
 
         await ctx.send("skipping!")
 
@@ -404,19 +543,11 @@ class PlaySound(commands.Cog):
         embed = discord.Embed()
         embed.add_field(name="prefix", value=opt["prefix"])
 
-        async def role_value():
+        def role_value():
             if opt["dj_id"] is None:
                 return str(None)
-
             role = guild.get_role(opt["dj_id"])
-            if role is None:
-                for x in await guild.fetch_roles():
-                    if x.id == opt["dj_id"]:
-                        role = x
-                        break
-                else:
-                    return str(None)
-            return role.name
+            return role.name if role is not None else str(None)
 
         def bool_value(x):
             if x:
@@ -424,7 +555,7 @@ class PlaySound(commands.Cog):
             else:
                 return "disable"
 
-        embed.add_field(name="dj", value=await role_value())
+        embed.add_field(name="dj", value=role_value())
         bools = {
             k: bool_value(v)
             for k, v in opt.items()
@@ -437,6 +568,19 @@ class PlaySound(commands.Cog):
         embed.add_field(name="black list", value="")
         await ctx.send(embed=embed)
 
+    @settings.command()
+    @commands.guild_only()
+    @checks.is_mod()
+    async def toggle(self, ctx: commands.Context, name: str):
+        guild = typing.cast(discord.Guild, ctx.guild)
+        if name not in ["announcesongs", "preventduplicates", "displaylists"]:
+            await ctx.send("そんな設定ないで")
+            return
+        value = not self.data.get_option(guild.id)[name]  # type: ignore
+        self.data.update_option(guild.id, **{name: value})
+        self.bot.dispatch("settings_update", guild.id)
+        await ctx.send(f"{name}: {'enabled' if value else 'disable'}")
+
     @commands.hybrid_command(aliases=["lc"])
     @commands.guild_only()
     @checks.is_dj()
@@ -455,16 +599,79 @@ class PlaySound(commands.Cog):
         ):
             raise Exception("unknown error")
 
-        members = channel.members
-        for i, x in reversed(list(enumerate(player.get_queue()))):
-            if x.author not in members:
-                player.queue.remove_index(i)
+        members = {x.id for x in channel.members}
+        player.remove_where(lambda x: x.author.id not in members)
 
         await ctx.send("cleanup done!")
 
-    @tasks.loop(hours=1)
-    async def delete_disconnected(self):
-        self.players = {k: v for k, v in self.players.items() if not v.disconnected}
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        if before.roles != after.roles:
+            permissions.invalidate_member(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_member_remove(self, member: discord.Member):
+        permissions.invalidate_member(member.guild.id, member.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if before.permissions != after.permissions:
+            permissions.invalidate_role(after.guild.id, after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        permissions.invalidate_role(role.guild.id, role.id)
+
+    @commands.Cog.listener()
+    async def on_guild_update(self, before: discord.Guild, after: discord.Guild):
+        if before.owner_id != after.owner_id:
+            permissions.invalidate_guild(after.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        permissions.invalidate_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_settings_update(self, guild_id: int):
+        permissions.invalidate_guild(guild_id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(
+        self,
+        member: discord.Member,
+        before: discord.VoiceState,
+        after: discord.VoiceState,
+    ):
+        guild_id = member.guild.id
+        if self.bot.user is not None and member.id == self.bot.user.id:
+            if after.channel is None:
+                self.drop_player(guild_id)
+            return
+        if (player := self.get_player(guild_id)) is None:
+            return
+        channel = player.voice_client.channel
+        if before.channel != channel and after.channel != channel:
+            return
+        if any(not x.bot for x in channel.members):
+            housekeeper.cancel(("alone", guild_id))
+        elif ("alone", guild_id) not in housekeeper:
+            housekeeper.schedule(
+                ("alone", guild_id),
+                ALONE_TIMEOUT_SEC,
+                lambda: self.leave_if_alone(guild_id),
+            )
+
+    @tasks.loop(minutes=1)
+    async def save_snapshots(self):
+        self.snapshots.capture(self.players)
+        if self.snapshots.dirty:
+            # serialize here; capture and pop mutate the states on the loop
+            await asyncio.to_thread(self.snapshots.write, self.snapshots.dump())
+
+    @tasks.loop(minutes=30)
+    async def warm_cache(self):
+        if is_primary() and warmer.off_peak():
+            await warmer.warm()
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -1,24 +1,55 @@
 import asyncio
+import logging
+import time
+from collections.abc import Callable
 from dataclasses import dataclass, field
 
 import discord
 
 from errors import AudioSourceNotFoundError, VoiceClientDisconnectedError
+from gapless import CROSSFADE_MS, FRAME_MS, BufferedSource
+from history import Play, history
+from housekeeping import housekeeper
+from metrics import playback_gap_seconds, source_open_seconds
+from progressive import ProgressiveAudio
 from queues import Queue
+from scheduler import scheduler
 from song import Song
 
 TIMEOUT_SEC = 30
+MIN_PREFETCH = 1
+MAX_PREFETCH = 10
+RELEASE_DISTANCE = 20
+DEFAULT_DURATION_SEC = 240.0
+PREFETCH_SAFETY = 2.0
+PREFETCH_MARGIN_SEC = 30.0
+PREFETCH_INTERVAL_SEC = 15.0
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
 class Player:
-    queue: Queue[Song] = field(default_factory=Queue, init=False)
+    queue: Queue[Song] = field(
+        default_factory=lambda: Queue(key=lambda x: x.key), init=False
+    )
     voice_client: discord.VoiceClient
     loop: asyncio.AbstractEventLoop
     # disconnected: bool = field(default=False, init=False)
     loop_queue: bool = field(default=False, init=False)
     loop_song: bool = field(default=False, init=False)
     now_play: Song | None = field(default=None, init=False)
+    crossfade_ms: int = field(default=CROSSFADE_MS, init=False)
+    current: BufferedSource | None = field(default=None, init=False)
+    prepared: tuple[Song, BufferedSource] | None = field(default=None, init=False)
+    preparing: Song | None = field(default=None, init=False)
+    ended_at: float | None = field(default=None, init=False)
+    started_at: float = field(default=0.0, init=False)
+    skipped: bool = field(default=False, init=False)
+    materialized: dict[int, Song] = field(default_factory=dict, init=False)
+    waiter: asyncio.Future[Song] | None = field(default=None, init=False)
+    on_disconnect: Callable[[], None] | None = field(default=None, init=False)
+    text_channel: discord.abc.Messageable | None = field(default=None, init=False)
 
     @property
     def disconnected(self):
@@ -33,48 +64,245 @@ class Player:
 
     def after(self, song: Song):
         def inner(_):
+            self.ended_at = time.perf_counter()
+            listened = time.monotonic() - self.started_at
+            event = "skip" if self.skipped else "play"
+            self.skipped = False
+            self.loop.call_soon_threadsafe(self.record, song, event, listened)
+            self.current = None
             self.now_play = None
             if not self.loop_song:
                 asyncio.run_coroutine_threadsafe(self.play(), self.loop)
                 if self.loop_queue:
-                    self.queue.put(song)
+                    self.loop.call_soon_threadsafe(self.queue.put, song)
+                    self.loop.call_soon_threadsafe(song.prepare_packets)
                     return
-                song.after()
+                # cancelling tasks and releasing flights is loop-only work
+                self.loop.call_soon_threadsafe(song.after)
                 return
             asyncio.run_coroutine_threadsafe(self.loop_play(song), self.loop)
 
         return inner
 
+    def record(self, song: Song, event: str, listened: float):
+        song.mark("finished" if event == "play" else "skipped", listened=listened)
+        song.emit_trace()
+        history.record(
+            Play(
+                at=time.time(),
+                guild_id=song.guild_id,
+                track=song.key,
+                url=getattr(song, "url", None),
+                requester=song.author.id,
+                event=event,
+                listened=listened,
+                duration=song.duration,
+                resolve_sec=song.elapsed("resolve_start", "resolved"),
+                download_sec=song.elapsed("requested", "downloaded"),
+            )
+        )
+
     async def loop_play(self, song: Song):
         self.now_play = song
-        self.voice_client.play(await song.get_source(), after=self.after(song))
+        song.prepare_packets()
+        self.start(song, await self.open(song))
 
-    async def play(self):
-        self.check()
-        # song = await asyncio.wait_for(self.queue.get(), 1)
+    async def open(self, song: Song) -> BufferedSource:
+        begin = time.perf_counter()
+        prepared = (source := self.take_prepared(song)) is not None
+        if source is None:
+            source = BufferedSource(await song.get_source(), self.crossfade_ms)
+        source_open_seconds.observe(time.perf_counter() - begin)
+        song.mark("source_opened", prepared=prepared)
+        return source
+
+    def start(self, song: Song, source: BufferedSource):
+        if self.loop_song or self.loop_queue:
+            song.prepare_packets()
+        if isinstance(source.original, ProgressiveAudio):
+            source.original.bind(self.voice_client)
+        if self.ended_at is not None:
+            playback_gap_seconds.observe(time.perf_counter() - self.ended_at)
+            self.ended_at = None
+        self.current = source
+        source.on_start = lambda: song.mark("first_frame")
+        self.started_at = time.monotonic()
+        self.voice_client.play(source, after=self.after(song))
+        self.schedule_prepare()
+        self.schedule_prefetch()
+
+    def next_song(self) -> Song | None:
+        if self.loop_song:
+            return self.now_play
+        return self.queue.peek()
+
+    def schedule_prepare(self):
+        song = self.next_song()
+        if song is None or self.now_play is None or self.preparing is song:
+            return
+        if self.prepared is not None and self.prepared[0] is song:
+            return
+        self.preparing = song
+        asyncio.create_task(self.prepare(song))
+
+    async def prepare(self, song: Song):
         try:
-            song = await asyncio.wait_for(self.queue.get(), TIMEOUT_SEC)
-            # song = await self.queue.get()
-        except asyncio.TimeoutError:
-            await self.disconnect()
+            source = BufferedSource(await song.get_source(), self.crossfade_ms)
+            await asyncio.to_thread(source.prime)
+            song.mark("source_prepared")
+        except Exception:
+            # play() opens the song again and reports it if it still fails
+            logger.warning("failed to prepare %s", song, exc_info=True)
             return
-        self.now_play = song
-        source = await song.get_source()
+        finally:
+            if self.preparing is song:
+                self.preparing = None
 
-        self.voice_client.play(
-            source,
-            after=self.after(song),
-        )
+        if self.next_song() is not song or self.now_play is None:
+            source.cleanup()
+            return
+        self.discard_prepared()
+        self.prepared = (song, source)
+        if self.current is not None:
+            self.current.next = source
+
+    def take_prepared(self, song: Song) -> BufferedSource | None:
+        if self.prepared is None or self.prepared[0] is not song:
+            self.discard_prepared()
+            return None
+        _, source = self.prepared
+        self.prepared = None
+        return source
+
+    def discard_prepared(self):
+        if self.prepared is None:
+            return
+        _, source = self.prepared
+        self.prepared = None
+        if self.current is not None and self.current.next is source:
+            self.current.next = None
+        source.cleanup()
+
+    def set_crossfade(self, ms: int):
+        self.crossfade_ms = ms
+        if self.current is not None:
+            self.current.crossfade = ms // FRAME_MS
+        if self.prepared is not None:
+            self.prepared[1].crossfade = ms // FRAME_MS
+
+    async def play(self):
+        while True:
+            self.check()
+            if self.queue.empty():
+                housekeeper.schedule(("idle", id(self)), TIMEOUT_SEC, self.idle)
+            self.waiter = asyncio.ensure_future(self.queue.get())
+            try:
+                song = await self.waiter
+            except asyncio.CancelledError:
+                return
+            finally:
+                self.waiter = None
+                housekeeper.cancel(("idle", id(self)))
+            self.now_play = song
+            self.prefetch()
+            try:
+                source = await self.open(song)
+            except Exception as e:
+                logger.warning("failed to open %s", song, exc_info=True)
+                self.fail(song, e)
+                continue
+            self.start(song, source)
+            return
+
+    def fail(self, song: Song, error: Exception):
+        song.mark("open_failed", error=type(error).__name__)
+        song.emit_trace()
+        self.now_play = None
+        song.after()
+        if self.text_channel is not None:
+            asyncio.create_task(self.text_channel.send(f"{song} は再生できへんかった"))
 
     def add(self, song: Song):
         self.check()
+        song.queue = self.queue
         self.queue.put(song)
+        self.prefetch()
+
+    def add_many(self, songs: list[Song]):
+        self.check()
+        for song in songs:
+            song.queue = self.queue
+        self.queue.put_many(songs)
+        self.prefetch()
+
+    def has_key(self, key: str | None) -> bool:
+        if key is None:
+            return False
+        if self.now_play is not None and self.now_play.key == key:
+            return True
+        return self.queue.count(key) > 0
+
+    def remaining(self) -> float:
+        if (song := self.now_play) is None:
+            return 0.0
+        duration = song.duration if song.duration is not None else DEFAULT_DURATION_SEC
+        return max(0.0, duration - (time.monotonic() - self.started_at))
+
+    def prefetch(self):
+        until_play = self.remaining()
+        for i, song in enumerate(self.queue):
+            if i >= MAX_PREFETCH:
+                break
+            duration = song.duration
+            if duration is None:
+                duration = DEFAULT_DURATION_SEC
+            needed = scheduler.meter.estimate(song.source_kind, duration)
+            if (
+                i < MIN_PREFETCH
+                or needed * PREFETCH_SAFETY + PREFETCH_MARGIN_SEC >= until_play
+            ):
+                song.materialize()
+                self.materialized[id(song)] = song
+            until_play += duration
+        self.trim()
+        self.schedule_prepare()
+
+    def trim(self):
+        for key, song in list(self.materialized.items()):
+            if song is self.now_play:
+                continue
+            distance = song.distance()
+            if not song.materialized or distance == 0:
+                del self.materialized[key]
+            elif distance > RELEASE_DISTANCE:
+                song.release()
+                del self.materialized[key]
+
+    def schedule_prefetch(self):
+        housekeeper.schedule(
+            ("prefetch", id(self)), PREFETCH_INTERVAL_SEC, self.prefetch_tick
+        )
+
+    def prefetch_tick(self):
+        if self.now_play is None or self.disconnected:
+            return
+        self.prefetch()
+        self.schedule_prefetch()
 
     def skip(self):
+        self.skipped = self.now_play is not None
         self.voice_client.stop()
 
     def add_first(self, song: Song):
+        song.queue = self.queue
         self.queue.put_first(song)
+        self.prefetch()
+
+    def add_many_first(self, songs: list[Song]):
+        for song in songs:
+            song.queue = self.queue
+        self.queue.put_many_first(songs)
+        self.prefetch()
 
     def is_paused(self):
         return self.voice_client.is_paused()
@@ -85,9 +313,27 @@ class Player:
     def resume(self):
         self.voice_client.resume()
 
+    def idle(self):
+        if self.now_play is not None or not self.queue.empty():
+            return
+        if self.waiter is not None:
+            self.waiter.cancel()
+        if not self.disconnected:
+            asyncio.create_task(self.disconnect())
+
     async def disconnect(self) -> None:
         self.check()
         await self.voice_client.disconnect()
+        if self.on_disconnect is not None:
+            self.on_disconnect()
+
+    def close(self):
+        housekeeper.cancel(("idle", id(self)))
+        housekeeper.cancel(("prefetch", id(self)))
+        if self.waiter is not None:
+            self.waiter.cancel()
+        self.discard_prepared()
+        self.clear()
 
     def get_queue(self):
         if self.now_play is None:
@@ -97,17 +343,43 @@ class Player:
     def replay(self):
         if self.now_play is None:
             raise AudioSourceNotFoundError
+        self.now_play.prepare_packets()
+        self.now_play.retain()
         self.add_first(self.now_play)
         self.voice_client.stop()
 
     def clear(self):
+        for song in self.queue:
+            song.after()
         self.queue.clear()
+        self.materialized.clear()
 
     def shuffle(self):
         self.queue.shuffle()
+        self.prefetch()
 
     def move(self, origin, target):
         self.queue.move(origin - 1, target - 1)
+        self.prefetch()
+
+    def remove_where(self, pred: Callable[[Song], bool]) -> list[Song]:
+        removed = self.queue.remove_where(pred)
+        self.release(removed)
+        return removed
+
+    def skip_to(self, target: int):
+        self.release(self.queue.drop_front(target - 1))
+        self.skip()
+
+    def release(self, songs: list[Song]):
+        for song in songs:
+            self.materialized.pop(id(song), None)
+            song.after()
+        self.prefetch()
 
     def remove(self, target):
+        song = self.queue[target - 1]
         self.queue.remove_index(target - 1)
+        self.materialized.pop(id(song), None)
+        song.after()
+        self.prefetch()
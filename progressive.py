@@ -0,0 +1,160 @@
+import io
+import logging
+import os
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import discord
+
+PROGRESSIVE = True
+PREBUFFER_BYTES = 256 * 1024
+REBUFFER_BYTES = 128 * 1024
+UNDERRUN_TIMEOUT_SEC = 15.0
+POLL_SEC = 0.05
+BLOCKSIZE = 8192
+# containers that need a seekable input (moov atom may sit at the end)
+UNSTREAMABLE = {".mp4", ".m4a", ".mov", ".3gp"}
+
+logger = logging.getLogger(__name__)
+
+
+class Buffer:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.finished = threading.Event()
+        self.failed = False
+
+    @property
+    def streamable(self):
+        return self.path.suffix.lower() not in UNSTREAMABLE
+
+    def available(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def ready(self, min_bytes: int = PREBUFFER_BYTES):
+        return self.finished.is_set() or self.available() >= min_bytes
+
+    def finish(self, failed: bool = False):
+        self.failed = failed
+        self.finished.set()
+
+
+class GrowingFile(io.BufferedIOBase):
+    def __init__(
+        self,
+        buffer: Buffer,
+        timeout: float = UNDERRUN_TIMEOUT_SEC,
+        rebuffer: int = REBUFFER_BYTES,
+    ) -> None:
+        self.buffer = buffer
+        self.timeout = timeout
+        self.rebuffer = rebuffer
+        self.position = 0
+        self.on_underrun: Callable[[], None] | None = None
+        self.on_recover: Callable[[], None] | None = None
+        self.file = open(buffer.path, "rb")
+
+    def readable(self):
+        return True
+
+    def read(self, size: int | None = -1, /) -> bytes:
+        data = self.file.read(size)
+        if data or self.buffer.finished.is_set():
+            return self._advance(data or self.file.read(size))
+        if not self._wait_rebuffer():
+            return b""
+        return self._advance(self.file.read(size))
+
+    def _advance(self, data: bytes):
+        if self.buffer.failed:
+            return b""
+        self.position += len(data)
+        return data
+
+    def _wait_rebuffer(self):
+        if self.on_underrun is not None:
+            self.on_underrun()
+        deadline = time.monotonic() + self.timeout
+        target = self.position + self.rebuffer
+        try:
+            while self.buffer.available() < target:
+                if self.buffer.finished.is_set():
+                    return not self.buffer.failed
+                if time.monotonic() > deadline:
+                    return False
+                self.buffer.finished.wait(POLL_SEC)
+            return True
+        finally:
+            if self.on_recover is not None:
+                self.on_recover()
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+class ProgressiveAudio(discord.FFmpegPCMAudio):
+    def __init__(self, buffer: Buffer, **kwargs) -> None:
+        self.reader = GrowingFile(buffer)
+        self.stopping = False
+        super().__init__(self.reader, pipe=True, **kwargs)
+
+    def bind(self, voice_client: discord.VoiceClient):
+        paused = False
+
+        def underrun():
+            nonlocal paused
+            if voice_client.is_playing():
+                paused = True
+                voice_client.pause()
+
+        def recover():
+            nonlocal paused
+            if paused:
+                paused = False
+                voice_client.resume()
+
+        self.reader.on_underrun = underrun
+        self.reader.on_recover = recover
+
+    # discord.py terminates FFmpeg when the pipe source hits EOF, which can cut
+    # the tail of the track, so close stdin and let FFmpeg drain instead.
+    def _pipe_writer(self, source: io.BufferedIOBase) -> None:
+        while self._process:
+            data = source.read(BLOCKSIZE)
+            if not data:
+                self.close_stdin()
+                return
+            try:
+                if self._stdin is not None:
+                    self._stdin.write(data)
+            except (OSError, ValueError):
+                # a stopped player kills FFmpeg under us; anything else is a fault
+                if self._process and not self.stopping:
+                    logger.warning("failed to feed FFmpeg", exc_info=True)
+                    self._process.terminate()
+                return
+
+    def close_stdin(self):
+        stdin, self._stdin = self._stdin, None
+        if stdin is None:
+            return
+        # Popen.communicate() flushes its stdin, which fails once closed
+        if self._process:
+            self._process.stdin = None
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+    def cleanup(self):
+        self.stopping = True
+        try:
+            super().cleanup()
+        finally:
+            self.reader.close()
@@ -0,0 +1,131 @@
+import weakref
+from dataclasses import dataclass, field
+
+import discord
+
+from player import Player
+from queues import Queue
+from song import Song
+
+PAGE_SIZE = 10
+VIEW_TIMEOUT_SEC = 180
+TITLE_LIMIT = 80
+DESCRIPTION_LIMIT = 4096
+PAGE_TEXT_LIMIT = 3584
+
+
+def format_duration(song: Song):
+    if song.duration is None:
+        return "--:--"
+    minutes, seconds = divmod(int(song.duration), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+def format_title(song: Song):
+    title = str(song).replace("[", "(").replace("]", ")")
+    if len(title) > TITLE_LIMIT:
+        title = title[: TITLE_LIMIT - 1] + "…"
+    if (url := getattr(song, "url", None)) is not None:
+        return f"[{title}]({url})"
+    return title
+
+
+def format_entry(i: int, song: Song):
+    return (
+        f"`{i + 1}.` {format_title(song)} | `{format_duration(song)}`"
+        f" | `Requested by {song.author}`"
+    )
+
+
+@dataclass
+class PageCache:
+    version: int = -1
+    pages: dict[int, str] = field(default_factory=dict)
+
+
+_caches: "weakref.WeakKeyDictionary[Queue, PageCache]" = weakref.WeakKeyDictionary()
+
+
+def page_count(queue: Queue) -> int:
+    return max(1, -(-len(queue) // PAGE_SIZE))
+
+
+def render_page(queue: Queue[Song], page: int) -> str:
+    cache = _caches.setdefault(queue, PageCache())
+    if cache.version != queue.version:
+        cache.version = queue.version
+        cache.pages.clear()
+    if (text := cache.pages.get(page)) is not None:
+        return text
+    start = page * PAGE_SIZE
+    lines = [
+        format_entry(start + i, x)
+        for i, x in enumerate(queue.slice(start, start + PAGE_SIZE))
+    ]
+    text = ""
+    for line in lines:
+        if len(text) + len(line) + 1 > PAGE_TEXT_LIMIT:
+            break
+        text += line + "\n"
+    cache.pages[page] = text
+    return text
+
+
+class QueueView(discord.ui.View):
+    def __init__(self, player: Player, title: str, page: int = 0) -> None:
+        super().__init__(timeout=VIEW_TIMEOUT_SEC)
+        self.player = player
+        self.title = title
+        self.page = page
+        self.message: discord.Message | None = None
+
+    def embed(self) -> discord.Embed:
+        queue = self.player.queue
+        self.page = min(max(self.page, 0), page_count(queue) - 1)
+        description = ""
+        if (now_play := self.player.now_play) is not None:
+            description += (
+                f"__Play now:__\n{format_title(now_play)}"
+                f" | `{format_duration(now_play)}`\n\n"
+            )
+        description += "__Next up:__\n" + (render_page(queue, self.page) or "empty")
+        embed = discord.Embed(
+            title=self.title, description=description[:DESCRIPTION_LIMIT]
+        )
+        embed.set_footer(
+            text=f"Page {self.page + 1}/{page_count(queue)} | {len(queue)} songs"
+        )
+        self.prev.disabled = self.page <= 0
+        self.next.disabled = self.page >= page_count(queue) - 1
+        return embed
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        self.page = page
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="≪", style=discord.ButtonStyle.secondary)
+    async def first(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.primary)
+    async def prev(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+    @discord.ui.button(label="≫", style=discord.ButtonStyle.secondary)
+    async def last(self, interaction: discord.Interaction, _: discord.ui.Button):
+        await self.show(interaction, page_count(self.player.queue) - 1)
+
+    async def on_timeout(self) -> None:
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(view=None)
+        except discord.HTTPException:
+            pass
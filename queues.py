@@ -1,41 +1,358 @@
 import asyncio
-from collections import deque
-from random import shuffle
+import random
+from collections import Counter, deque
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from itertools import chain, islice
 from typing import Generic, TypeVar
 
 T = TypeVar("T")
+BLOCK_LOAD = 512
+
+
+class _Block(Generic[T]):
+    __slots__ = ("items", "pos")
+
+    def __init__(self, items: list[T]) -> None:
+        self.items = items
+        self.pos = 0
+
+
+class BlockedList(Generic[T]):
+    def __init__(self, items: Iterable[T] = (), load: int = BLOCK_LOAD) -> None:
+        self._load = load
+        self._blocks: list[_Block[T]] = []
+        self._where: dict[int, list[_Block[T]]] = {}
+        # fenwick tree over block sizes; positions and ranks are O(log blocks)
+        self._tree: list[int] = [0]
+        # entries still pointing at blocks drop_front retired
+        self._stale = 0
+        self._len = 0
+        self.extend(items)
+
+    def _track(self, item, block):
+        self._where.setdefault(id(item), []).append(block)
+
+    def _untrack(self, item, block):
+        blocks = self._where[id(item)]
+        blocks.remove(block)
+        if not blocks:
+            del self._where[id(item)]
+
+    def _live(self, item) -> list[_Block[T]]:
+        return [x for x in self._where.get(id(item), ()) if x.pos >= 0]
+
+    def _compact(self):
+        self._where = {}
+        self._stale = 0
+        for block in self._blocks:
+            for x in block.items:
+                self._track(x, block)
+
+    def _reindex(self):
+        # only block splits and removals get here, so the rebuild amortizes
+        size = len(self._blocks)
+        tree = [0] * (size + 1)
+        for b, block in enumerate(self._blocks, 1):
+            block.pos = b - 1
+            tree[b] += len(block.items)
+            if (parent := b + (b & -b)) <= size:
+                tree[parent] += tree[b]
+        self._tree = tree
+
+    def _grow(self, b: int, delta: int):
+        tree = self._tree
+        b += 1
+        while b < len(tree):
+            tree[b] += delta
+            b += b & -b
+
+    def _rank(self, b: int) -> int:
+        tree = self._tree
+        total = 0
+        while b > 0:
+            total += tree[b]
+            b -= b & -b
+        return total
+
+    def _normalize(self, i: int, clamp: bool = False) -> int:
+        if i < 0:
+            i += self._len
+        if clamp:
+            return min(max(i, 0), self._len)
+        if not 0 <= i < self._len:
+            raise IndexError("queue index out of range")
+        return i
+
+    def _locate(self, i: int) -> tuple[int, int]:
+        if not 0 <= i < self._len:
+            raise IndexError("queue index out of range")
+        tree = self._tree
+        size = len(tree) - 1
+        b = 0
+        step = 1 << (size.bit_length() - 1)
+        while step:
+            if b + step <= size and tree[b + step] <= i:
+                b += step
+                i -= tree[b]
+            step >>= 1
+        return b, i
+
+    def _split(self, b: int):
+        block = self._blocks[b]
+        half = len(block.items) // 2
+        moved = _Block(block.items[half:])
+        del block.items[half:]
+        for x in moved.items:
+            blocks = self._where[id(x)]
+            blocks[blocks.index(block)] = moved
+        self._blocks.insert(b + 1, moved)
+        self._reindex()
+
+    def _rebuild(self, items: list[T]):
+        self._blocks = []
+        self._where = {}
+        self._tree = [0]
+        self._stale = 0
+        self._len = 0
+        self.extend(items)
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self) -> Iterator[T]:
+        return chain.from_iterable(x.items for x in self._blocks)
+
+    def __getitem__(self, i: int) -> T:
+        b, off = self._locate(self._normalize(i))
+        return self._blocks[b].items[off]
+
+    def __contains__(self, item) -> bool:
+        return any(x.pos >= 0 for x in self._where.get(id(item), ()))
+
+    def slice(self, start: int, stop: int) -> list[T]:
+        start = self._normalize(start, clamp=True)
+        stop = self._normalize(stop, clamp=True)
+        if start >= stop:
+            return []
+        b, off = self._locate(start)
+        blocks = (x.items for x in self._blocks[b:])
+        first = next(blocks)[off:]
+        return list(islice(chain(first, chain.from_iterable(blocks)), stop - start))
+
+    def insert(self, i: int, item: T):
+        i = self._normalize(i, clamp=True)
+        if not self._blocks:
+            self._blocks.append(_Block([]))
+            self._reindex()
+        if i < self._len:
+            b, off = self._locate(i)
+        else:
+            b, off = len(self._blocks) - 1, len(self._blocks[-1].items)
+        block = self._blocks[b]
+        block.items.insert(off, item)
+        self._track(item, block)
+        self._len += 1
+        self._grow(b, 1)
+        if len(block.items) > 2 * self._load:
+            self._split(b)
+
+    def append(self, item: T):
+        self.insert(self._len, item)
+
+    def appendleft(self, item: T):
+        self.insert(0, item)
+
+    def extend(self, items: Iterable[T]):
+        items = list(items)
+        if self._blocks and len(self._blocks[-1].items) < self._load:
+            block = self._blocks[-1]
+            room = self._load - len(block.items)
+            head, items = items[:room], items[room:]
+            block.items.extend(head)
+            for x in head:
+                self._track(x, block)
+            self._len += len(head)
+            self._grow(len(self._blocks) - 1, len(head))
+        if not items:
+            return
+        for start in range(0, len(items), self._load):
+            block = _Block(items[start : start + self._load])
+            for x in block.items:
+                self._track(x, block)
+            self._blocks.append(block)
+        self._len += len(items)
+        self._reindex()
+
+    def pop(self, i: int = -1) -> T:
+        b, off = self._locate(self._normalize(i))
+        block = self._blocks[b]
+        item = block.items.pop(off)
+        self._untrack(item, block)
+        self._len -= 1
+        if block.items:
+            self._grow(b, -1)
+        else:
+            del self._blocks[b]
+            self._reindex()
+        return item
+
+    def popleft(self) -> T:
+        return self.pop(0)
+
+    def index(self, item: T) -> int:
+        blocks = self._live(item)
+        if not blocks:
+            raise ValueError
+        return min(
+            self._rank(x.pos) + next(i for i, y in enumerate(x.items) if y is item)
+            for x in blocks
+        )
+
+    def drop_front(self, k: int) -> list[T]:
+        k = min(max(k, 0), self._len)
+        whole = taken = 0
+        for block in self._blocks:
+            if taken + len(block.items) > k:
+                break
+            taken += len(block.items)
+            whole += 1
+        # whole blocks are retired in one slice and their index entries left
+        # stale until compaction; only the next block is cut item by item
+        gone = self._blocks[:whole]
+        del self._blocks[:whole]
+        dropped = list(chain.from_iterable(x.items for x in gone))
+        for block in gone:
+            block.pos = -1
+            block.items = []
+        self._stale += len(dropped)
+        if (rest := k - taken) > 0:
+            block = self._blocks[0]
+            head = block.items[:rest]
+            del block.items[:rest]
+            for x in head:
+                self._untrack(x, block)
+            dropped.extend(head)
+        self._len -= k
+        self._reindex()
+        if self._stale > self._len + self._load:
+            self._compact()
+        return dropped
+
+    def remove_where(self, pred: Callable[[T], bool]) -> list[T]:
+        keep: list[T] = []
+        removed: list[T] = []
+        for x in self:
+            (removed if pred(x) else keep).append(x)
+        if removed:
+            self._rebuild(keep)
+        return removed
+
+    def shuffle(self):
+        items = list(self)
+        random.shuffle(items)
+        self._rebuild(items)
+
+    def clear(self):
+        self._rebuild([])
 
 
 class Queue(Generic[T]):
-    def __init__(self):
+    def __init__(self, key: Callable[[T], Hashable | None] | None = None):
         self._getters: deque[asyncio.Future] = deque()
+        self._key = key
+        self._keys: Counter[Hashable] = Counter()
+        self.version = 0
         self._init()
 
     def _init(self):
-        self._queue: deque[T] = deque()
+        self._queue: BlockedList[T] = BlockedList()
+
+    def _count(self, items: Iterable[T], delta: int):
+        if self._key is None:
+            return
+        for item in items:
+            if (key := self._key(item)) is None:
+                continue
+            self._keys[key] += delta
+            if self._keys[key] <= 0:
+                del self._keys[key]
+
+    def count(self, key: Hashable) -> int:
+        return self._keys.get(key, 0)
+
+    def touch(self):
+        self.version += 1
 
     def get_nowait(self):
-        return self._queue.popleft()
+        self.touch()
+        item = self._queue.popleft()
+        self._count((item,), -1)
+        return item
+
+    def peek(self) -> T | None:
+        return self._queue[0] if self._queue else None
 
     def put(self, item):
+        self.touch()
         self._queue.append(item)
+        self._count((item,), 1)
+        self._wakeup_next()
+
+    def put_many(self, items):
+        self.touch()
+        items = list(items)
+        self._queue.extend(items)
+        self._count(items, 1)
         self._wakeup_next()
 
     def put_first(self, item):
+        self.touch()
         self._queue.appendleft(item)
+        self._count((item,), 1)
+        self._wakeup_next()
+
+    def put_many_first(self, items):
+        self.touch()
+        items = list(items)
+        for item in reversed(items):
+            self._queue.appendleft(item)
+        self._count(items, 1)
         self._wakeup_next()
 
     def insert(self, index, item):
+        self.touch()
         self._queue.insert(index, item)
+        self._count((item,), 1)
         self._wakeup_next()
 
     def move(self, old_index: int, target_index: int):
-        tmp = self._queue[old_index]
-        del self._queue[old_index]
+        self.touch()
+        tmp = self._queue.pop(old_index)
         self._queue.insert(target_index, tmp)
 
     def remove_index(self, i: int):
-        del self._queue[i]
+        self.touch()
+        item = self._queue.pop(i)
+        self._count((item,), -1)
+        return item
+
+    def index(self, item: T) -> int:
+        return self._queue.index(item)
+
+    def drop_front(self, k: int) -> list[T]:
+        self.touch()
+        dropped = self._queue.drop_front(k)
+        self._count(dropped, -1)
+        return dropped
+
+    def remove_where(self, pred: Callable[[T], bool]) -> list[T]:
+        self.touch()
+        removed = self._queue.remove_where(pred)
+        self._count(removed, -1)
+        return removed
+
+    def slice(self, start: int, stop: int) -> list[T]:
+        return self._queue.slice(start, stop)
 
     def _wakeup_next(self):
         while self._getters:
@@ -45,10 +362,19 @@ class Queue(Generic[T]):
                 break
 
     def shuffle(self):
-        shuffle(self._queue)
+        self.touch()
+        self._queue.shuffle()
 
     def clear(self):
+        self.touch()
         self._queue.clear()
+        self._keys.clear()
+
+    def __getitem__(self, i: int) -> T:
+        return self._queue[i]
+
+    def __contains__(self, item: T) -> bool:
+        return item in self._queue
 
     def __len__(self):
         return len(self._queue)
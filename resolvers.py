@@ -0,0 +1,163 @@
+import re
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Protocol
+from urllib.parse import urlsplit, urlunsplit
+
+import discord
+
+from errors import AudioUrlError
+from http_client import HttpClient
+
+if TYPE_CHECKING:
+    from song import Song
+
+YOUTUBE_HOST = r"https?://(?:www\.|m\.|music\.)?youtube\.com"
+YOUTUBE_ID = r"(?P<id>[\w-]{11})(?![\w-])"
+SOUNDCLOUD_HOST = r"https?://(?:www\.|m\.)?soundcloud\.com"
+DISCORD_HOST = r"https?://(?:(?:ptb|canary)\.)?discord(?:app)?\.com"
+
+YOUTUBE_PLAYLIST = (
+    YOUTUBE_HOST + r"/(?:playlist\?list=|@|channel/|c/|user/)(?P<id>[\w\-.%]+)"
+)
+YOUTUBE_WATCH = YOUTUBE_HOST + r"/watch\?(?:[^#]*?&)?v=" + YOUTUBE_ID
+YOUTUBE_PATH = YOUTUBE_HOST + r"/(?:shorts|embed|live|v)/" + YOUTUBE_ID
+YOUTU_BE = r"https?://(?:www\.)?youtu\.be/" + YOUTUBE_ID
+SOUNDCLOUD_SET = SOUNDCLOUD_HOST + r"/(?P<user>[\w-]+)/sets/(?P<set>[\w-]+)"
+SOUNDCLOUD_USER = (
+    SOUNDCLOUD_HOST + r"/(?P<user>[\w-]+)/?(?:tracks|albums|likes)?/?(?:\?.*)?$"
+)
+SOUNDCLOUD_TRACK = SOUNDCLOUD_HOST + r"/(?P<user>[\w-]+)/(?P<track>[\w-]+)"
+DISCORD_MESSAGE = (
+    DISCORD_HOST
+    + r"/channels/(?:[0-9]+|@me)/(?P<channel>[0-9]+)/(?P<message>[0-9]+)"
+)
+
+GROUP = re.compile(r"\(\?P<(\w+)>")
+
+
+@dataclass
+class Env:
+    http: HttpClient
+    client: discord.Client
+
+
+class Source(Protocol):
+    @classmethod
+    def from_match(
+        cls, match: "Match", author: discord.Member, env: Env
+    ) -> "Song":
+        ...
+
+    @classmethod
+    async def expand_match(
+        cls, match: "Match", author: discord.Member, env: Env
+    ) -> "list[Song]":
+        ...
+
+
+@dataclass(frozen=True)
+class Resolver:
+    name: str
+    pattern: str
+    extractor: str
+    source: type[Source]
+    playlist: bool = False
+    casefold: bool = False
+
+
+@dataclass(frozen=True)
+class Match:
+    resolver: Resolver
+    url: str
+    id: str
+
+    @property
+    def key(self):
+        return f"{self.resolver.extractor}:{self.id}"
+
+    @property
+    def playlist(self):
+        return self.resolver.playlist
+
+    def build(self, author: discord.Member, env: Env) -> "Song":
+        return self.resolver.source.from_match(self, author, env)
+
+    async def expand(self, author: discord.Member, env: Env) -> "list[Song]":
+        return await self.resolver.source.expand_match(self, author, env)
+
+
+class Resolvers:
+    def __init__(self) -> None:
+        self.resolvers: list[Resolver] = []
+        self.compiled: re.Pattern[str] | None = None
+
+    def __len__(self):
+        return len(self.resolvers)
+
+    def register(
+        self,
+        name: str,
+        pattern: str,
+        extractor: str | None = None,
+        playlist: bool = False,
+        casefold: bool = False,
+    ):
+        def inner(source: Any):
+            self.resolvers.append(
+                Resolver(
+                    name,
+                    pattern,
+                    extractor if extractor is not None else name,
+                    source,
+                    playlist,
+                    casefold,
+                )
+            )
+            self.compiled = None
+            return source
+
+        return inner
+
+    def compile(self) -> re.Pattern[str]:
+        # one alternation; earlier registrations win where patterns overlap
+        branches = [
+            f"(?P<r{i}>" + GROUP.sub(rf"(?P<r{i}_\1>", x.pattern) + ")"
+            for i, x in enumerate(self.resolvers)
+        ]
+        self.compiled = re.compile("|".join(branches), re.IGNORECASE)
+        return self.compiled
+
+    def match(self, url: str) -> Match | None:
+        compiled = self.compiled if self.compiled is not None else self.compile()
+        if (m := compiled.match(url.strip())) is None or m.lastgroup is None:
+            return None
+        index = int(m.lastgroup[1:])
+        resolver = self.resolvers[index]
+        prefix = f"r{index}_"
+        id = "/".join(
+            v for k, v in m.groupdict().items() if k.startswith(prefix) and v
+        )
+        if resolver.casefold:
+            id = id.lower()
+        return Match(resolver, url.strip(), id)
+
+    def resolve(self, url: str) -> Match:
+        if (match := self.match(url)) is None:
+            raise AudioUrlError
+        return match
+
+
+def canonical_key(url: str) -> str | None:
+    if (match := resolvers.match(url)) is not None:
+        return match.key
+
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if parts.scheme in ("http", "https") and host:
+        return "url:" + urlunsplit(
+            (parts.scheme.lower(), host, parts.path, parts.query, "")
+        )
+    return None
+
+
+resolvers = Resolvers()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Protocol
+
+MAX_DOWNLOADS = 6
+MAX_GUILD_DOWNLOADS = 2
+DEFAULT_REALTIME_FACTOR = 20.0
+SMOOTHING = 0.3
+
+
+class Schedulable(Protocol):
+    @property
+    def guild_id(self) -> int:
+        ...
+
+    @property
+    def duration(self) -> float | None:
+        ...
+
+    @property
+    def source_kind(self) -> str:
+        ...
+
+    def distance(self) -> int:
+        ...
+
+    def mark(self, event: str) -> None:
+        ...
+
+
+class ThroughputMeter:
+    def __init__(self, default: float = DEFAULT_REALTIME_FACTOR) -> None:
+        self.default = default
+        self.factors: dict[str, float] = {}
+
+    def record(self, kind: str, media_sec: float, wall_sec: float):
+        factor = media_sec / max(wall_sec, 0.001)
+        if (old := self.factors.get(kind)) is not None:
+            factor = old + SMOOTHING * (factor - old)
+        self.factors[kind] = factor
+
+    def factor(self, kind: str) -> float:
+        return self.factors.get(kind, self.default)
+
+    def estimate(self, kind: str, media_sec: float) -> float:
+        return media_sec / self.factor(kind)
+
+
+@dataclass
+class Pending:
+    song: Schedulable
+    guild_id: int
+    seq: int
+    future: asyncio.Future[None] = field(
+        default_factory=lambda: asyncio.get_running_loop().create_future()
+    )
+
+
+class DownloadScheduler:
+    def __init__(
+        self, limit: int = MAX_DOWNLOADS, guild_limit: int = MAX_GUILD_DOWNLOADS
+    ) -> None:
+        self.limit = limit
+        self.guild_limit = guild_limit
+        self.pending: list[Pending] = []
+        self.active: Counter[int] = Counter()
+        self.served: dict[int, int] = {}
+        self.seq = count()
+        self.meter = ThroughputMeter()
+
+    @property
+    def running(self):
+        return sum(self.active.values())
+
+    @asynccontextmanager
+    async def slot(self, song: Schedulable):
+        guild_id = song.guild_id
+        await self.acquire(song)
+        song.mark("download_start")
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(guild_id)
+        if (duration := song.duration) is not None:
+            self.meter.record(song.source_kind, duration, time.monotonic() - start)
+
+    async def acquire(self, song: Schedulable):
+        entry = Pending(song, song.guild_id, next(self.seq))
+        self.pending.append(entry)
+        self.dispatch()
+        try:
+            await entry.future
+        except asyncio.CancelledError:
+            if entry.future.done() and not entry.future.cancelled():
+                self.release(entry.guild_id)
+            elif entry in self.pending:
+                self.pending.remove(entry)
+            raise
+
+    def release(self, guild_id: int):
+        self.active[guild_id] -= 1
+        if self.active[guild_id] <= 0:
+            del self.active[guild_id]
+        self.dispatch()
+
+    def priority(self, entry: Pending):
+        return (
+            entry.song.distance(),
+            self.active[entry.guild_id],
+            self.served.get(entry.guild_id, -1),
+            entry.seq,
+        )
+
+    def dispatch(self):
+        while self.pending and self.running < self.limit:
+            eligible = [
+                x for x in self.pending if self.active[x.guild_id] < self.guild_limit
+            ]
+            if not eligible:
+                return
+            entry = min(eligible, key=self.priority)
+            self.pending.remove(entry)
+            if entry.future.done():
+                continue
+            self.active[entry.guild_id] += 1
+            self.served[entry.guild_id] = entry.seq
+            entry.future.set_result(None)
+
+
+scheduler = DownloadScheduler()
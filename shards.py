@@ -0,0 +1,125 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - windows
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+WORKER = os.environ.get("PLAY_SOUND_WORKER")
+WORKERS = int(os.environ.get("PLAY_SOUND_WORKERS", "1"))
+SHARDS = int(os.environ.get("PLAY_SOUND_SHARDS", "0"))
+RESTART_DELAY_SEC = 5.0
+
+
+def worker_index() -> int:
+    return int(WORKER) if WORKER is not None else 0
+
+
+def is_primary() -> bool:
+    return worker_index() == 0
+
+
+def worker_path(path: Path, worker: str | None = WORKER) -> Path:
+    if worker is None:
+        return path
+    return path.with_name(f"{path.name}.w{worker}")
+
+
+def worker_of(path: Path) -> int | None:
+    _, dot, suffix = path.name.rpartition(".w")
+    return int(suffix) if dot and suffix.isdigit() else None
+
+
+@contextmanager
+def file_lock(path: Path, shared: bool = False):
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def try_lock(fd: int, shared: bool = False) -> bool:
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def shard_ids(worker: int, workers: int, shards: int) -> list[int]:
+    return [x for x in range(shards) if x % workers == worker]
+
+
+def run_worker(worker: int, workers: int, shards: int):
+    os.environ["PLAY_SOUND_WORKER"] = str(worker)
+    os.environ["PLAY_SOUND_WORKERS"] = str(workers)
+    os.environ["PLAY_SOUND_SHARDS"] = str(shards)
+
+    import discord
+    from discord.ext import commands
+
+    class ShardBot(commands.AutoShardedBot):
+        async def on_ready(self) -> None:
+            print(f"worker {worker} ready: shards {self.shard_ids}")
+
+        async def setup_hook(self) -> None:
+            await self.load_extension("play_sound")
+            if worker == 0:
+                await self.tree.sync()
+
+    bot = ShardBot(
+        "t!",
+        intents=discord.Intents.all(),
+        shard_ids=shard_ids(worker, workers, shards),
+        shard_count=shards,
+    )
+    bot.run(os.environ["DIS_TEST_TOKEN"], root_logger=True, log_level=logging.INFO)
+
+
+def supervise(workers: int, shards: int):
+    ctx = multiprocessing.get_context("spawn")
+    procs: dict[int, multiprocessing.process.BaseProcess] = {}
+    try:
+        while True:
+            for worker in range(workers):
+                proc = procs.get(worker)
+                if proc is not None and proc.is_alive():
+                    continue
+                if proc is not None:
+                    logger.warning("worker %d exited with %s", worker, proc.exitcode)
+                proc = ctx.Process(
+                    target=run_worker, args=(worker, workers, shards), daemon=False
+                )
+                proc.start()
+                procs[worker] = proc
+            time.sleep(RESTART_DELAY_SEC)
+    except KeyboardInterrupt:
+        for proc in procs.values():
+            proc.terminate()
+        for proc in procs.values():
+            proc.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shards", type=int, default=SHARDS)
+    args = parser.parse_args()
+    shards = max(args.shards, args.workers)
+    logging.basicConfig(level=logging.INFO)
+    supervise(args.workers, shards)
@@ -0,0 +1,153 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import TypedDict
+
+import discord
+
+from http_client import HttpClient
+from player import Player
+from shards import worker_path
+from song import (
+    DiscordMessageLinkSong,
+    DiscordMessageSong,
+    OnlineSong,
+    Song,
+    YoutubeSong,
+    YtDlpSong,
+)
+
+SNAPSHOT_FILE = worker_path(Path(__file__).resolve().parent.joinpath("snapshot.json"))
+SNAPSHOT_TTL_SEC = 24 * 60 * 60
+
+
+class SongState(TypedDict):
+    kind: str
+    url: str
+    author: int
+    key: str | None
+    id: str | None
+    title: str | None
+    duration: float | None
+    thumbnail: str | None
+
+
+class PlayerState(TypedDict):
+    loop_queue: bool
+    loop_song: bool
+    songs: list[SongState]
+    saved_at: float
+
+
+def dump_song(song: Song) -> SongState | None:
+    if isinstance(song, DiscordMessageLinkSong):
+        kind, url = "discord", song.url
+    elif isinstance(song, DiscordMessageSong):
+        if song.mes is None:
+            return None
+        kind, url = "discord", song.mes.jump_url
+    elif isinstance(song, (YtDlpSong, YoutubeSong, OnlineSong)):
+        kind, url = type(song).__name__, song.url
+    else:
+        return None
+    return SongState(
+        kind=kind,
+        url=url,
+        author=song.author.id,
+        key=song.key,
+        id=song.id,
+        title=song.title,
+        duration=song.duration,
+        thumbnail=song.thumbnail,
+    )
+
+
+def dump_player(player: Player) -> PlayerState:
+    songs = [player.now_play] if player.now_play is not None else []
+    songs.extend(player.queue)
+    return PlayerState(
+        loop_queue=player.loop_queue,
+        loop_song=player.loop_song,
+        songs=[x for x in map(dump_song, songs) if x is not None],
+        saved_at=time.time(),
+    )
+
+
+def load_song(
+    state: SongState,
+    author: discord.Member,
+    http: HttpClient,
+    client: discord.Client,
+) -> Song:
+    if state["kind"] == "discord":
+        song: Song = DiscordMessageLinkSong(
+            author, http, state["url"], client, lazy=True
+        )
+    elif state["kind"] == "YoutubeSong":
+        song = YoutubeSong(author, state["url"], lazy=True)
+    elif state["kind"] == "OnlineSong":
+        song = OnlineSong(author, state["url"], http, lazy=True)
+    else:
+        song = YtDlpSong(author, state["url"], lazy=True)
+    song.id = state["id"]
+    song.title = state["title"]
+    song.duration = state["duration"]
+    song.thumbnail = state["thumbnail"]
+    return song
+
+
+class SnapshotStore:
+    def __init__(self, file: Path = SNAPSHOT_FILE, ttl: float = SNAPSHOT_TTL_SEC):
+        self.file = file
+        self.ttl = ttl
+        try:
+            self.states: dict[str, PlayerState] = json.loads(file.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.states = {}
+        self.versions: dict[int, tuple[int, bool, bool, int]] = {}
+        self.dirty = False
+
+    def capture(self, players: dict[int, Player]) -> bool:
+        changed = False
+        for guild_id, player in players.items():
+            version = (
+                player.queue.version,
+                player.loop_queue,
+                player.loop_song,
+                id(player.now_play),
+            )
+            if self.versions.get(guild_id) == version:
+                continue
+            self.versions[guild_id] = version
+            if (state := dump_player(player))["songs"]:
+                self.states[str(guild_id)] = state
+            else:
+                self.states.pop(str(guild_id), None)
+            changed = True
+        self.dirty |= changed
+        return changed
+
+    def pop(self, guild_id: int) -> PlayerState | None:
+        state = self.states.pop(str(guild_id), None)
+        self.versions.pop(guild_id, None)
+        if state is None or state["saved_at"] + self.ttl < time.time():
+            return None
+        return state
+
+    def discard(self, guild_id: int):
+        self.versions.pop(guild_id, None)
+        if self.states.pop(str(guild_id), None) is not None:
+            self.dirty = True
+
+    def dump(self) -> str:
+        self.dirty = False
+        return json.dumps(self.states)
+
+    def write(self, data: str):
+        tmp = self.file.with_name(f"{self.file.name}.{os.getpid()}.tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.file)
+
+    def save(self):
+        self.write(self.dump())
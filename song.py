@@ -3,19 +3,65 @@ import json
 import mimetypes
 import os
 import sys
+import time
 import uuid
 from abc import ABCMeta, abstractmethod
 from asyncio import subprocess
+from collections.abc import AsyncIterator, Callable
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import cast, final
+from typing import Any, cast, final
+from urllib.parse import urlparse
 
 import aiofiles
-import aiohttp
 import discord
 import magic
-
-from errors import AudioExtensionError, AudioSourceNotFoundError
+from aiohttp import ClientResponse
+
+from cache import DownloadCache
+from errors import (
+    AudioExtensionError,
+    AudioSizeError,
+    AudioSourceNotFoundError,
+    ExtractorUnavailableError,
+)
+from extractor import FORMAT, extractor
+from flights import Flight, flights
+from http_client import HttpClient
+from metadata import Metadata, MetadataCache
+from metrics import (
+    cache_lookups,
+    download_bytes,
+    download_seconds,
+    downloads,
+    downloads_coalesced,
+    downloads_in_flight,
+)
+from opus_store import OpusPacketSource, ingest
+from progressive import POLL_SEC, PROGRESSIVE, Buffer, ProgressiveAudio
+from queues import Queue
+from resolvers import (
+    DISCORD_MESSAGE,
+    SOUNDCLOUD_SET,
+    SOUNDCLOUD_TRACK,
+    SOUNDCLOUD_USER,
+    YOUTU_BE,
+    YOUTUBE_PATH,
+    YOUTUBE_PLAYLIST,
+    YOUTUBE_WATCH,
+    Env,
+    Match,
+    canonical_key,
+    resolvers,
+)
+from scheduler import scheduler
+from tracing import Trace, tracer
+
+CHUNK_SIZE = 64 * 1024
+MAX_DOWNLOAD_BYTES = int(
+    os.environ.get("PLAY_SOUND_MAX_DOWNLOAD_BYTES", str(512 * 1024**2))
+)
+AUDIO_MIME_PREFIXES = ("audio/", "video/", "application/ogg")
 
 
 class TempDir:
@@ -31,33 +77,289 @@ class TempDir:
         # res.touch()
         return res
 
+    def subdir(self, name: str):
+        res = self.tempdir.joinpath(name)
+        if not res.is_dir():
+            res.mkdir()
+        return res
+
 
 tempdir = TempDir()
+cache = DownloadCache(tempdir.tempdir.joinpath("tracks"))
+metadata = MetadataCache(tempdir.tempdir.joinpath("metadata.json"))
+packets = tempdir.subdir("packets")
+
+
+async def pinned(fn: Callable[..., Path | None], key: str, *args: Any):
+    # the pin is taken in a worker thread, so release it if we stop waiting
+    future = asyncio.ensure_future(asyncio.to_thread(fn, key, *args))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+
+        def release(_):
+            if (
+                not future.cancelled()
+                and future.exception() is None
+                and future.result() is not None
+            ):
+                cache.unpin(key)
+
+        future.add_done_callback(release)
+        raise
 
 
 @dataclass
 class Song(metaclass=ABCMeta):
     id: str | None = field(default=None, init=False)
     filename: str | None = field(default=None, init=False)
+    key: str | None = field(default=None, init=False)
     title: str | None = field(default=None, init=False)
+    duration: float | None = field(default=None, init=False)
+    thumbnail: str | None = field(default=None, init=False)
+    buffer: Buffer | None = field(default=None, init=False)
+    queue: "Queue[Song] | None" = field(default=None, init=False, repr=False)
     author: discord.Member
+    lazy: bool = field(default=False, kw_only=True, repr=False)
+    packing: asyncio.Task[Path] | None = field(default=None, init=False, repr=False)
+    timings: dict[str, float] = field(default_factory=dict, init=False, repr=False)
+    trace: Trace | None = field(default=None, init=False, repr=False)
+    flight: Flight | None = field(default=None, init=False, repr=False)
+    holds: int = field(default=1, init=False, repr=False)
+    cached: bool = field(default=False, init=False, repr=False)
 
     @final
     def __post_init__(self):
-        self.task = self.create_task()
+        self.resolved: asyncio.Task[None] | None = None
+        self.task: asyncio.Future[str] | None = None
+        self.key = self.make_key()
+        self.trace = tracer.start()
+        self.mark("created")
+        if not self.lazy:
+            self.start_resolve()
+
+    def mark(self, event: str, **attrs: Any):
+        self.timings[event] = time.monotonic()
+        if self.trace is not None:
+            self.trace.add(event, attrs)
+
+    def emit_trace(self):
+        if (trace := self.trace) is None:
+            return
+        self.trace = None
+        tracer.emit(
+            trace,
+            kind=type(self).__name__,
+            guild=self.guild_id if self.author is not None else None,
+            key=self.key,
+            title=self.title,
+        )
+
+    def start_resolve(self):
+        self.resolved = self.create_resolve_task()
+        if self.resolved is not None:
+            self.mark("resolve_start")
+            self.watch(self.resolved, "resolved")
+
+    def watch(self, task: asyncio.Future | None, event: str):
+        if task is not None:
+            task.add_done_callback(lambda _: self.mark(event))
+
+    def elapsed(self, start: str, end: str) -> float | None:
+        if start not in self.timings or end not in self.timings:
+            return None
+        return self.timings[end] - self.timings[start]
+
+    def make_key(self) -> str | None:
+        url = getattr(self, "url", None)
+        return canonical_key(url) if url is not None else None
+
+    @property
+    def materialized(self):
+        return self.task is not None
+
+    def materialize(self) -> asyncio.Future[str]:
+        if self.task is None:
+            self.mark("requested")
+            if self.resolved is None:
+                self.start_resolve()
+            self.flight = flights.join(self.key or f"song:{id(self)}", self)
+            # cancelling one song must not cancel a download others share
+            self.task = asyncio.shield(self.flight.task)
+            if self.flight.leader is not self:
+                self.mark("coalesced", refs=self.flight.refs)
+                downloads_coalesced.inc(kind=type(self).__name__)
+                self.watch(self.task, "downloaded")
+        return self.task
+
+    def observe(self, task: asyncio.Task[str]):
+        kind = type(self).__name__
+        downloads_in_flight.inc(kind=kind)
+
+        def done(_):
+            downloads_in_flight.dec(kind=kind)
+            if task.cancelled():
+                self.mark("download_cancelled")
+                downloads.inc(kind=kind, result="cancelled")
+                return
+            if (e := task.exception()) is not None:
+                self.mark("download_failed", error=type(e).__name__)
+                downloads.inc(kind=kind, result="error")
+                return
+            try:
+                size = os.path.getsize(task.result())
+            except OSError:
+                size = None
+            self.mark("downloaded", bytes=size, cached=self.cached)
+            if self.cached:
+                # served from the content cache; no transfer to time or size
+                downloads.inc(kind=kind, result="cached")
+                return
+            downloads.inc(kind=kind, result="ok")
+            if (elapsed := self.elapsed("requested", "downloaded")) is not None:
+                download_seconds.observe(elapsed, kind=kind)
+            if size is not None:
+                download_bytes.observe(size, kind=kind)
+
+        task.add_done_callback(done)
+
+    def downloaded(self) -> str | None:
+        task = self.task
+        if task is None or not task.done() or task.cancelled():
+            return None
+        if task.exception() is not None:
+            return None
+        return task.result()
+
+    def retain(self):
+        self.holds += 1
+
+    def release(self):
+        self.drop()
+        self.task = None
+        self.filename = None
+        self.buffer = None
+
+    @property
+    def guild_id(self) -> int:
+        return self.author.guild.id
+
+    @property
+    def source_kind(self) -> str:
+        return type(self).__name__
+
+    def distance(self) -> int:
+        if self.queue is None:
+            return 0
+        try:
+            return self.queue.index(self) + 1
+        except ValueError:
+            return 0
 
-    async def get_source(self):
-        # self.filename = name = await self.task
-        if self.filename is None:
-            self.filename = await self.task
+    def prepare_packets(self):
+        if self.packing is not None or (source := self.downloaded()) is None:
+            return
+        target = packets.joinpath(f"{uuid.uuid4()}.opkt")
+        self.packing = asyncio.create_task(ingest(source, target))
+
+    def packed(self) -> Path | None:
+        packing = self.packing
+        if packing is None or not packing.done() or packing.cancelled():
+            return None
+        if packing.exception() is not None:
+            return None
+        return packing.result()
+
+    def drop_packets(self):
+        if (packing := self.packing) is None:
+            return
+        self.packing = None
+
+        def remove(task: asyncio.Task[Path]):
+            if not task.cancelled() and task.exception() is None:
+                task.result().unlink(missing_ok=True)
 
+        packing.add_done_callback(remove)
+
+    async def get_source(self):
+        if (packed := self.packed()) is not None:
+            return OpusPacketSource(packed)
+
+        task = self.materialize()
+        if (
+            PROGRESSIVE
+            and not task.done()
+            and (buffer := await self.prebuffer(task)) is not None
+        ):
+            self.filename = str(buffer.path)
+            return ProgressiveAudio(buffer)
+
+        self.filename = await task
         return discord.FFmpegPCMAudio(self.filename)
 
+    def shared_buffer(self) -> Buffer | None:
+        if self.buffer is not None or self.flight is None:
+            return self.buffer
+        return self.flight.buffer
+
+    async def prebuffer(self, task: asyncio.Future[str]) -> Buffer | None:
+        while not task.done():
+            buffer = self.shared_buffer()
+            if buffer is not None and buffer.streamable and buffer.ready():
+                return buffer
+            await asyncio.wait([task], timeout=POLL_SEC)
+        return None
+
+    async def stream(self, file: Path, first: bytes, chunks: AsyncIterator[bytes]):
+        self.buffer = buffer = Buffer(file)
+        size = len(first)
+        try:
+            async with aiofiles.open(file, "wb") as f:
+                await f.write(first)
+                await f.flush()
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > MAX_DOWNLOAD_BYTES:
+                        raise AudioSizeError
+                    await f.write(chunk)
+                    await f.flush()
+        except BaseException:
+            buffer.finish(failed=True)
+            file.unlink(missing_ok=True)
+            raise
+        buffer.finish()
+
+    @staticmethod
+    def check_response(res: ClientResponse):
+        if res.status != 200:
+            raise AudioSourceNotFoundError
+        if (length := res.content_length) is not None and length > MAX_DOWNLOAD_BYTES:
+            raise AudioSizeError
+
     def after(self):
-        if self.filename is None:
-            return
+        self.holds -= 1
+        if self.holds <= 0:
+            self.drop()
+
+    def drop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+        self.drop_packets()
+        if (flight := self.flight) is not None:
+            self.flight = None
+            flights.release(flight)
+
+    def dispose(self, filename: str):
+        try:
+            os.remove(filename)
+        except FileNotFoundError:
+            pass
+
+    def unshared(self) -> None:
+        return None
 
-        os.remove(self.filename)
+    def create_resolve_task(self) -> asyncio.Task[None] | None:
+        return None
 
     @abstractmethod
     def create_task(self) -> asyncio.Task[str]:
@@ -76,22 +378,31 @@ class Song(metaclass=ABCMeta):
 @dataclass
 class OnlineSong(Song):
     url: str
+    http: HttpClient
+
+    @property
+    def source_kind(self) -> str:
+        return urlparse(self.url).netloc
 
     def create_task(self):
         async def task():
-            async with aiohttp.ClientSession() as session:
-                async with session.get(self.url) as res:
-                    mime = res.headers.get("content-type")
-                    data = await res.read()
-                    if mime is None:
-                        mime = cast(str, magic.from_buffer(data))
+            async with scheduler.slot(self):
+                async with self.http.get(self.url) as res:
+                    self.check_response(res)
+                    chunks = res.content.iter_chunked(CHUNK_SIZE)
+                    first = await anext(chunks, b"")
+                    mime = res.headers.get("content-type", "").partition(";")[0]
+                    if not mime.strip().startswith(AUDIO_MIME_PREFIXES):
+                        mime = cast(str, magic.from_buffer(first, mime=True))
+                    mime = mime.strip()
+                    if not mime.startswith(AUDIO_MIME_PREFIXES):
+                        raise AudioExtensionError
 
                     extension = mimetypes.guess_extension(mime, strict=False)
                     if extension is None:
                         extension = ""
                     file = tempdir.touch(extension)
-                    async with aiofiles.open(file, "wb") as f:
-                        await f.write(data)
+                    await self.stream(file, first, chunks)
 
             return str(file)
 
@@ -100,25 +411,37 @@ class OnlineSong(Song):
 
 @dataclass
 class DiscordMessageSong(Song):
-    mes: discord.Message
-
-    def create_task(self):
-        async def task():
-            if not self.mes.attachments:
-                raise AudioSourceNotFoundError
-
-            att = self.mes.attachments[0]
-            _, dot, ext = att.filename.partition(".")
-            extension = dot + ext or mimetypes.guess_extension(
-                att.content_type if att.content_type is not None else ""
-            )
-            if extension is None:
-                raise AudioExtensionError
+    mes: discord.Message | None
+    http: HttpClient
 
-            await att.save(name := tempdir.touch(extension))
-            return str(name)
+    def make_key(self) -> str | None:
+        if self.mes is None:
+            return super().make_key()
+        return canonical_key(self.mes.jump_url)
 
-        return asyncio.create_task(task())
+    def create_task(self):
+        return asyncio.create_task(self.download())
+
+    async def download(self) -> str:
+        if self.mes is None or not self.mes.attachments:
+            raise AudioSourceNotFoundError
+
+        att = self.mes.attachments[0]
+        _, dot, ext = att.filename.partition(".")
+        extension = dot + ext or mimetypes.guess_extension(
+            att.content_type if att.content_type is not None else ""
+        )
+        if extension is None:
+            raise AudioExtensionError
+        if att.size > MAX_DOWNLOAD_BYTES:
+            raise AudioSizeError
+
+        name = tempdir.touch(extension)
+        async with scheduler.slot(self):
+            async with self.http.get(att.url) as res:
+                self.check_response(res)
+                await self.stream(name, b"", res.content.iter_chunked(CHUNK_SIZE))
+        return str(name)
 
 
 @dataclass
@@ -127,6 +450,10 @@ class DiscordMessageLinkSong(DiscordMessageSong):
     client: discord.Client
     mes: discord.Message | None = field(default=None, init=False)
 
+    @classmethod
+    def from_match(cls, match: Match, author: discord.Member, env: Env):
+        return cls(author, env.http, match.url, env.client)
+
     def create_task(self):
         async def task():
             channel_id, message_id = (int(x) for x in self.url.split("/")[-2::])
@@ -137,7 +464,7 @@ class DiscordMessageLinkSong(DiscordMessageSong):
                 raise AudioSourceNotFoundError
 
             self.mes = await channel.fetch_message(message_id)
-            return await super().create_task()
+            return await self.download()
 
         return asyncio.create_task(task())
 
@@ -149,42 +476,27 @@ class YoutubeSong(Song):
     def create_task(self):
         async def task():
             name = tempdir.touch("")
-            cmd = self.make_cmd(name)
-            # print(cmd)
-            cmd_dl = [*cmd, self.url]
-            # print(cmd_dl)
-            cmd_get_name = [*cmd, "--get-filename", self.url]
-            dl = asyncio.create_task(
-                asyncio.create_subprocess_exec(
-                    *cmd_dl, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            async with scheduler.slot(self):
+                try:
+                    return await extractor.download(
+                        self.url, outtmpl=f"{name}.%(ext)s", format="bestaudio"
+                    )
+                except ExtractorUnavailableError:
+                    pass
+                cmd = self.make_cmd(name)
+                dl = await asyncio.create_subprocess_exec(
+                    *cmd, self.url, stdout=subprocess.PIPE, stderr=subprocess.PIPE
                 )
-            )
-            get_name = asyncio.create_task(
-                asyncio.create_subprocess_exec(
-                    *cmd_get_name, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+                get_name = await asyncio.create_subprocess_exec(
+                    *cmd,
+                    "--get-filename",
+                    self.url,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
                 )
-            )
-            # dl, name = await asyncio.gather(dl, get_name)
-            await dl
-            name = await get_name
-            file_name, _ = await name.communicate()
-            # def con(x: Tuple[bytes, bytes]):
-            #     a, b = x
-            #     return a.decode("utf8"), b.decode("utf_8")
-
-            # res = [
-            #     con(await x.communicate()) for x in await asyncio.gather(dl, get_name)
-            # ]
-            # print(res)
-
-            # return res[1][0]
-            # res = await get_name
-            # (
-            #     stdout,
-            #     stderr,
-            # ) = await res.communicate()
-            # print(stdout, stderr)
-            return file_name.decode("ascii")
+                await dl.communicate()
+                file_name, _ = await get_name.communicate()
+            return file_name.decode("ascii").strip()
 
         return asyncio.create_task(task())
 
@@ -196,39 +508,210 @@ class YoutubeSong(Song):
 @dataclass
 class YtDlpSong(Song):
     url: str
+    cache_key: str | None = field(default=None, init=False)
+    info_file: Path | None = field(default=None, init=False)
+    target: Path | None = field(default=None, init=False)
+
+    def apply_metadata(self, meta: Metadata):
+        self.id = meta["id"]
+        self.title = meta["title"]
+        self.duration = meta["duration"]
+        self.thumbnail = meta["thumbnail"]
+        self.cache_key = self.key or meta["key"]
+        if (ext := meta.get("ext")) is not None:
+            name = f'{meta["extractor"]}-{self.id}.{ext}'
+            self.target = cache.directory.joinpath(name)
+        if self.queue is not None:
+            self.queue.touch()
+
+    def create_resolve_task(self) -> asyncio.Task[None]:
+        async def task():
+            key = self.key or self.url
+            if (meta := metadata.get(key, stale=key in cache)) is not None:
+                cache_lookups.inc(cache="metadata", result="hit")
+                self.apply_metadata(meta)
+                return
+            cache_lookups.inc(cache="metadata", result="miss")
+
+            json_str = await self.extract()
+            self.info_file = tempdir.touch(".info.json")
+            async with aiofiles.open(self.info_file, "w") as f:
+                await f.write(json_str)
+            self.apply_metadata(metadata.put(key, json.loads(json_str)))
+            await asyncio.to_thread(metadata.save)
+
+        return asyncio.create_task(task())
 
     def create_task(self) -> asyncio.Task[str]:
         async def task():
-            cmd = [
-                "yt-dlp",
-                "-o",
-                rf"{tempdir.tempdir}\%(id)s.%(ext)s",
-                "-j",
-                "--no-simulate",
-                self.url,
-            ]
-
-            res = await asyncio.create_subprocess_exec(
-                *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
-            )
-            (stdout, stderr) = await res.communicate()
-            if stderr == b"":
-                print(stderr.decode("ascii"), file=sys.stderr)
+            # the canonical key finds a cached file without fresh metadata
+            if self.key is None and self.resolved is not None:
+                await self.resolved
+            key = self.cache_key = self.key or cast(str, self.cache_key)
+            if (path := await pinned(cache.acquire, key)) is not None:
+                cache_lookups.inc(cache="download", result="hit")
+                self.cached = True
+                self.drop_info_file()
+                return str(path)
+            cache_lookups.inc(cache="download", result="miss")
+
+            if self.resolved is not None:
+                await self.resolved
+            async with cache.lease(key):
+                # another process may have fetched it while we waited
+                if (path := await pinned(cache.acquire, key)) is not None:
+                    self.cached = True
+                    self.drop_info_file()
+                    return str(path)
+                async with scheduler.slot(self):
+                    if self.target is None:
+                        path = await self.fetch(
+                            str(cache.directory.joinpath(cache.filename_template()))
+                        )
+                    else:
+                        path = await self.download_progressive(self.target)
+                self.drop_info_file()
+                return str(await pinned(cache.add, key, path))
 
-            json_str = stdout.decode("ascii").splitlines()[0]
+        return asyncio.create_task(task())
 
-            data = json.loads(json_str)
-            id = data["id"]
-            title = data["title"]
-            # print(title)
-            self.id = id
-            self.title = title
-            return str(tempdir.tempdir.joinpath(f'{id}.{data["ext"]}'))
+    async def download_progressive(self, path: Path):
+        marker = path.with_name(path.name + ".part")
+        marker.touch()
+        self.buffer = buffer = Buffer(path)
+        try:
+            await self.fetch(str(path), nopart=True)
+        except BaseException:
+            buffer.finish(failed=True)
+            path.unlink(missing_ok=True)
+            raise
+        finally:
+            marker.unlink(missing_ok=True)
+        buffer.finish()
+        return path
+
+    @classmethod
+    def from_match(cls, match: Match, author: discord.Member, env: Env):
+        return cls(author, match.url)
+
+    @classmethod
+    async def expand_match(cls, match: Match, author: discord.Member, env: Env):
+        entries = await cls.expand(match.url)
+        if not entries:
+            raise AudioSourceNotFoundError
+        return [cls.from_entry(author, x) for x in entries]
+
+    @classmethod
+    def from_entry(cls, author: discord.Member, entry: dict[str, Any]):
+        song = cls(author, entry["url"], lazy=True)
+        song.id = entry.get("id")
+        song.title = entry.get("title")
+        song.duration = entry.get("duration")
+        if thumbnails := entry.get("thumbnails"):
+            song.thumbnail = thumbnails[-1].get("url")
+        return song
+
+    @classmethod
+    async def expand(cls, url: str) -> list[dict[str, Any]]:
+        try:
+            info = await extractor.extract_info(
+                url, extract_flat="in_playlist", noplaylist=False
+            )
+        except ExtractorUnavailableError:
+            info = json.loads(await cls.run("--flat-playlist", "-J", url))
+        return [x for x in info.get("entries") or [] if x and x.get("url")]
 
-        return asyncio.create_task(task())
+    async def extract(self) -> str:
+        try:
+            return json.dumps(await extractor.extract_info(self.url))
+        except ExtractorUnavailableError:
+            pass
+        stdout = await self.run(
+            "-f", FORMAT, "-j", "--skip-download", "--no-playlist", self.url
+        )
+        return stdout.splitlines()[0]
+
+    async def fetch(self, outtmpl: str, nopart: bool = False) -> Path:
+        info_file = str(self.info_file) if self.info_file is not None else None
+        try:
+            return Path(
+                await extractor.download(
+                    self.url, info_file, outtmpl=outtmpl, nopart=nopart
+                )
+            )
+        except ExtractorUnavailableError:
+            pass
+        source = (
+            ["--load-info-json", info_file]
+            if info_file is not None
+            else ["--no-playlist", self.url]
+        )
+        stdout = await self.run(
+            "-f",
+            FORMAT,
+            "-o",
+            outtmpl,
+            *(["--no-part"] if nopart else []),
+            "--no-simulate",
+            "--print",
+            "after_move:filepath",
+            *source,
+        )
+        return Path(stdout.splitlines()[-1])
 
-    def after(self):
-        pass
+    @staticmethod
+    async def run(*args: str) -> str:
+        res = await asyncio.create_subprocess_exec(
+            "yt-dlp",
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            (stdout, stderr) = await res.communicate()
+        except asyncio.CancelledError:
+            res.kill()
+            raise
+        if stderr:
+            print(stderr.decode("utf8", "replace"), file=sys.stderr)
+        if res.returncode != 0 or not stdout:
+            raise AudioSourceNotFoundError
+        return stdout.decode("utf8")
+
+    def drop_info_file(self):
+        if self.info_file is not None:
+            self.info_file.unlink(missing_ok=True)
+            self.info_file = None
+
+    def drop(self):
+        # the shared download may still load the leader's info file; the
+        # flight hands it back through unshared() once no song holds it
+        leads = self.flight is not None and self.flight.leader is self
+        super().drop()
+        if not leads:
+            self.drop_info_file()
+
+    def unshared(self):
+        self.drop_info_file()
+
+    def dispose(self, filename: str):
+        cache.unpin(cast(str, self.cache_key))
+        asyncio.get_running_loop().run_in_executor(None, cache.evict)
+
+
+# playlists first: their urls would also match the single track patterns
+resolvers.register("youtube_playlist", YOUTUBE_PLAYLIST, playlist=True)(YtDlpSong)
+resolvers.register(
+    "soundcloud_set", SOUNDCLOUD_SET, playlist=True, casefold=True
+)(YtDlpSong)
+resolvers.register(
+    "soundcloud_user", SOUNDCLOUD_USER, playlist=True, casefold=True
+)(YtDlpSong)
+resolvers.register("youtube_watch", YOUTUBE_WATCH, "youtube")(YtDlpSong)
+resolvers.register("youtube_path", YOUTUBE_PATH, "youtube")(YtDlpSong)
+resolvers.register("youtu_be", YOUTU_BE, "youtube")(YtDlpSong)
+resolvers.register("soundcloud", SOUNDCLOUD_TRACK, casefold=True)(YtDlpSong)
+resolvers.register("discord", DISCORD_MESSAGE)(DiscordMessageLinkSong)
 
 
 if __name__ == "__main__":
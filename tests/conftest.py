@@ -0,0 +1,119 @@
+import io
+import sys
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Any
+
+import discord
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+
+def make_track(seconds: float) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as f:
+        f.setnchannels(CHANNELS)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(b"\0" * int(seconds * SAMPLE_RATE) * CHANNELS * 2)
+    return buf.getvalue()
+
+
+class FakeVoiceClient:
+    def __init__(
+        self, channel: Any = None, autoplay: bool = True, frame_sec: float = 0.0
+    ) -> None:
+        self.channel = channel
+        self.autoplay = autoplay
+        self.frame_sec = frame_sec
+        self.connected = True
+        self.paused = False
+        self.played: list[discord.AudioSource] = []
+        self.frames = 0
+        self.tag: Any = None
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+
+    def is_connected(self):
+        return self.connected
+
+    def is_playing(self):
+        return bool(self.played) and not self.finished.is_set()
+
+    def is_paused(self):
+        return self.paused
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    def stop(self):
+        self.stopped.set()
+
+    def play(self, source: discord.AudioSource, *, after):
+        self.played.append(source)
+        if not self.autoplay:
+            return
+        self.stopped = threading.Event()
+        self.finished.clear()
+        threading.Thread(
+            target=self.run,
+            args=(source, after, self.tag, self.stopped, self.finished),
+            daemon=True,
+        ).start()
+
+    def run(self, source, after, tag, stopped, finished):
+        first = True
+        while not stopped.is_set():
+            if self.paused:
+                time.sleep(self.frame_sec or 0.001)
+                continue
+            if not source.read():
+                break
+            self.frames += 1
+            self.on_frame(tag, first)
+            first = False
+            if self.frame_sec:
+                time.sleep(self.frame_sec)
+        source.cleanup()
+        after(None)
+        finished.set()
+        self.on_end(tag)
+
+    def on_frame(self, tag: Any, first: bool):
+        pass
+
+    def on_end(self, tag: Any):
+        pass
+
+    async def disconnect(self, *, force: bool = False):
+        self.connected = False
+        self.stop()
+
+
+class FakeChannel(discord.abc.Messageable):
+    def __init__(self, messages: dict[int, Any] | None = None) -> None:
+        self.messages = messages if messages is not None else {}
+        self.sent: list[str] = []
+
+    async def _get_channel(self):
+        return self
+
+    async def fetch_message(self, id: int, /):
+        return self.messages[id]
+
+    async def send(self, content: str):  # type: ignore[override]
+        self.sent.append(content)
+
+
+@pytest.fixture
+def track():
+    return make_track(0.5)
@@ -0,0 +1,61 @@
+import asyncio
+import os
+from pathlib import Path
+
+from cache import DownloadCache
+
+
+def add(cache: DownloadCache, name: str, size: int):
+    path = cache.directory.joinpath(name)
+    path.write_bytes(b"x" * size)
+    key = cache.key_from_filename(name)
+    assert key is not None
+    cache.add(key, path)
+    cache.unpin(key)
+    return key
+
+
+def test_leases_serialize_and_clean_up(tmp_path: Path):
+    cache = DownloadCache(tmp_path)
+    order: list[str] = []
+
+    async def hold(name: str):
+        async with cache.lease("youtube:aaaaaaaaaaa"):
+            order.append(f"{name} in")
+            await asyncio.sleep(0.3)
+            order.append(f"{name} out")
+
+    async def main():
+        await asyncio.gather(hold("a"), hold("b"))
+
+    asyncio.run(main())
+    assert order in (
+        ["a in", "a out", "b in", "b out"],
+        ["b in", "b out", "a in", "a out"],
+    )
+    assert not cache.lease_path("youtube:aaaaaaaaaaa").exists()
+
+
+def test_evict_removes_stale_lease(tmp_path: Path):
+    cache = DownloadCache(tmp_path, max_bytes=10)
+    key = add(cache, "Youtube-aaaaaaaaaaa.wav", 8)
+    cache.lease_path(key).touch()
+    add(cache, "Youtube-bbbbbbbbbbb.wav", 8)
+    assert key not in cache
+    assert not cache.lease_path(key).exists()
+
+
+def test_pinned_file_survives_eviction(tmp_path: Path):
+    cache = DownloadCache(tmp_path, max_bytes=10)
+    key = add(cache, "Youtube-aaaaaaaaaaa.wav", 8)
+    assert cache.acquire(key) is not None
+    add(cache, "Youtube-bbbbbbbbbbb.wav", 8)
+    assert key in cache
+    cache.unpin(key)
+    cache.evict()
+    assert key not in cache
+    assert sorted(os.listdir(tmp_path)) == [
+        ".lock",
+        "Youtube-bbbbbbbbbbb.wav",
+        "index.json",
+    ]
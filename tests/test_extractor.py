@@ -0,0 +1,139 @@
+import asyncio
+import operator
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from errors import AudioSourceNotFoundError
+from extractor import WorkerDiedError, WorkerPool
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_call_and_reuse():
+    async def main():
+        pool = WorkerPool(1)
+        try:
+            assert await pool.call(5, operator.add, 1, 2) == 3
+            with pytest.raises(ValueError):
+                await pool.call(5, int, "x")
+            assert len(pool.idle) == 1
+            assert pool.idle[0].tasks == 2
+        finally:
+            pool.shutdown()
+
+    run(main())
+
+
+def test_queue_time_is_not_counted():
+    async def main():
+        pool = WorkerPool(1)
+        try:
+            await pool.call(5, operator.add, 0, 0)
+            results = await asyncio.gather(
+                pool.call(0.5, time.sleep, 0.3), pool.call(0.5, time.sleep, 0.3)
+            )
+            assert results == [None, None]
+        finally:
+            pool.shutdown()
+
+    run(main())
+
+
+def test_timeout_kills_only_its_worker():
+    async def main():
+        pool = WorkerPool(2)
+        try:
+            await asyncio.gather(
+                pool.call(5, operator.add, 0, 0), pool.call(5, operator.add, 0, 0)
+            )
+            slow = asyncio.create_task(pool.call(5, time.sleep, 0.5))
+            with pytest.raises(AudioSourceNotFoundError):
+                await pool.call(0.1, time.sleep, 5)
+            assert await slow is None
+            assert len(pool.idle) == 1
+        finally:
+            pool.shutdown()
+
+    run(main())
+
+
+def test_cancel_kills_worker():
+    async def main():
+        pool = WorkerPool(1)
+        try:
+            await pool.call(5, operator.add, 0, 0)
+            worker = pool.idle[0]
+            task = asyncio.create_task(pool.call(30, time.sleep, 30))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            worker.process.join(5)
+            assert not worker.process.is_alive()
+            assert not pool.busy and not pool.idle
+            assert await pool.call(5, operator.add, 2, 2) == 4
+        finally:
+            pool.shutdown()
+
+    run(main())
+
+
+def test_jobs_do_not_hold_executor_threads():
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(1))
+        pool = WorkerPool(2)
+        try:
+            await asyncio.gather(
+                pool.call(5, operator.add, 0, 0), pool.call(5, operator.add, 0, 0)
+            )
+            jobs = [asyncio.create_task(pool.call(5, time.sleep, 1)) for _ in range(2)]
+            await asyncio.sleep(0.1)
+            begin = time.perf_counter()
+            await asyncio.to_thread(lambda: None)
+            assert time.perf_counter() - begin < 0.5
+            assert await asyncio.gather(*jobs) == [None, None]
+        finally:
+            pool.shutdown()
+
+    run(main())
+
+
+def test_shutdown_fails_waiting_jobs():
+    async def main():
+        pool = WorkerPool(1)
+        await pool.call(5, operator.add, 0, 0)
+        task = asyncio.create_task(pool.call(30, time.sleep, 30))
+        await asyncio.sleep(0.2)
+        pool.shutdown()
+        with pytest.raises(WorkerDiedError):
+            await asyncio.wait_for(task, 5)
+
+    run(main())
+
+
+class Unpicklable(Exception):
+    def __init__(self) -> None:
+        super().__init__()
+        self.callback = lambda: None
+
+
+def raise_unpicklable():
+    raise Unpicklable
+
+
+def test_unpicklable_error_keeps_the_worker():
+    async def main():
+        pool = WorkerPool(1)
+        try:
+            with pytest.raises(RuntimeError, match="Unpicklable"):
+                await pool.call(5, raise_unpicklable)
+            assert len(pool.idle) == 1
+        finally:
+            pool.shutdown()
+
+    run(main())
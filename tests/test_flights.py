@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+from flights import Flights
+from song import YtDlpSong
+
+
+class Leader:
+    def __init__(self) -> None:
+        self.buffer = None
+        self.gate = asyncio.Event()
+        self.starts = 0
+        self.disposed: list[str] = []
+        self.released = 0
+
+    def create_task(self):
+        self.starts += 1
+
+        async def task():
+            await self.gate.wait()
+            return "track.opus"
+
+        return asyncio.create_task(task())
+
+    def observe(self, task):
+        pass
+
+    def dispose(self, filename: str):
+        self.disposed.append(filename)
+
+    def unshared(self):
+        self.released += 1
+
+
+def author():
+    return SimpleNamespace(id=1, guild=SimpleNamespace(id=1))
+
+
+def test_refcount_disposes_after_last_release():
+    async def main():
+        flights = Flights()
+        leader, other = Leader(), Leader()
+        first = flights.join("k", leader)
+        second = flights.join("k", other)
+        assert first is second and first.refs == 2 and other.starts == 0
+        leader.gate.set()
+        await first.task
+        flights.release(first)
+        assert leader.disposed == [] and leader.released == 0
+        flights.release(second)
+        assert leader.disposed == ["track.opus"] and leader.released == 1
+        assert len(flights) == 0
+
+    asyncio.run(main())
+
+
+def test_last_release_cancels_pending_download():
+    async def main():
+        flights = Flights()
+        leader = Leader()
+        flight = flights.join("k", leader)
+        flights.release(flight)
+        await asyncio.sleep(0)
+        assert flight.task.cancelled() and flight.failed
+        assert leader.disposed == [] and leader.released == 1
+
+    asyncio.run(main())
+
+
+def test_failed_flight_is_replaced():
+    async def main():
+        flights = Flights()
+        leader = Leader()
+        flight = flights.join("k", leader)
+        flight.task.cancel()
+        await asyncio.sleep(0)
+        retry = flights.join("k", Leader())
+        assert retry is not flight and retry.refs == 1
+        flights.release(flight)
+        assert flights.flights["k"] is retry
+
+    asyncio.run(main())
+
+
+def test_leader_info_file_outlives_the_leader(tmp_path):
+    async def main():
+        gate = asyncio.Event()
+
+        async def fetch():
+            await gate.wait()
+            return "track.opus"
+
+        songs = [
+            YtDlpSong(author(), "https://youtu.be/aaaaaaaaaaa", lazy=True)
+            for _ in range(2)
+        ]
+        for song in songs:
+            song.create_resolve_task = lambda: None  # type: ignore
+            song.create_task = lambda: asyncio.create_task(fetch())  # type: ignore
+        leader, follower = songs
+        info_file = leader.info_file = tmp_path.joinpath("a.info.json")
+        info_file.write_text("{}")
+        leader.materialize()
+        follower.materialize()
+        assert follower.flight is leader.flight
+
+        leader.drop()
+        assert info_file.exists()
+        follower.drop()
+        assert not info_file.exists()
+
+    asyncio.run(main())
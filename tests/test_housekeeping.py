@@ -0,0 +1,77 @@
+import asyncio
+
+from housekeeping import TimerWheel
+
+# long enough that only the test advances the wheel
+TICK = 1000.0
+
+
+def run_ticks(wheel: TimerWheel, fired: list, ticks: int):
+    seen = []
+    for tick in range(1, ticks + 1):
+        wheel.advance()
+        seen.extend((tick, x) for x in fired)
+        fired.clear()
+    return seen
+
+
+def test_timers_wait_out_their_rounds():
+    async def main():
+        wheel = TimerWheel(TICK, size=4)
+        fired: list[str] = []
+        wheel.schedule("far", 10 * TICK, lambda: fired.append("far"))
+        wheel.schedule("near", 2 * TICK, lambda: fired.append("near"))
+        wheel.schedule("lap", 4 * TICK, lambda: fired.append("lap"))
+        wheel.schedule("soon", 0.1, lambda: fired.append("soon"))
+        assert wheel.timers["far"].rounds == 2
+        assert run_ticks(wheel, fired, 10) == [
+            (1, "soon"),
+            (2, "near"),
+            (4, "lap"),
+            (10, "far"),
+        ]
+        assert len(wheel) == 0 and not any(wheel.slots)
+
+    asyncio.run(main())
+
+
+def test_cancel_and_reschedule():
+    async def main():
+        wheel = TimerWheel(TICK, size=4)
+        fired: list[str] = []
+        wheel.schedule("a", 2 * TICK, lambda: fired.append("a"))
+        wheel.schedule("b", 2 * TICK, lambda: fired.append("b"))
+        wheel.cancel("b")
+        wheel.cancel("missing")
+        assert "b" not in wheel
+        wheel.schedule("a", 6 * TICK, lambda: fired.append("a again"))
+        assert len(wheel) == 1
+        assert run_ticks(wheel, fired, 6) == [(6, "a again")]
+
+    asyncio.run(main())
+
+
+def test_failing_callback_does_not_stop_others():
+    async def main():
+        wheel = TimerWheel(TICK, size=4)
+        fired: list[str] = []
+
+        def boom():
+            raise RuntimeError
+
+        wheel.schedule("boom", TICK, boom)
+        wheel.schedule("ok", TICK, lambda: fired.append("ok"))
+        assert run_ticks(wheel, fired, 1) == [(1, "ok")]
+
+    asyncio.run(main())
+
+
+def test_wheel_fires_on_the_loop():
+    async def main():
+        wheel = TimerWheel(0.01, size=4)
+        done = asyncio.get_running_loop().create_future()
+        wheel.schedule("x", 0.05, lambda: done.set_result(None))
+        await asyncio.wait_for(done, 1)
+        assert wheel.handle is None
+
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+import asyncio
+import json
+
+from jsons import Jsons, default_options
+
+
+def options(**changes):
+    return {**default_options(), **changes}
+
+
+def test_replay_stops_at_torn_last_line(tmp_path):
+    file = tmp_path.joinpath("data.json")
+    file.write_text(json.dumps({"1": options(prefix="?"), "2": options(prefix="$")}))
+    entries = [
+        {"guild": "1", "options": options(prefix="!")},
+        {"guild": "2", "options": None},
+        {"guild": "3", "options": options(maxqueuelength=5)},
+    ]
+    lines = [json.dumps(x) + "\n" for x in entries]
+    # the last append was cut off mid-write
+    file.with_name("data.json.journal").write_text("".join(lines[:2]) + lines[2][:20])
+
+    async def main():
+        jsons = Jsons(file)
+        await jsons.read()
+        return jsons
+
+    jsons = asyncio.run(main())
+    assert jsons.get_option(1)["prefix"] == "!"
+    assert "2" not in jsons.data
+    assert "3" not in jsons.data
+    # replayed entries were compacted into the file and the journal dropped
+    assert json.loads(file.read_text()) == {"1": options(prefix="!")}
+    assert not file.with_name("data.json.journal").exists()
+
+
+def test_updates_survive_a_reload_through_the_journal(tmp_path):
+    file = tmp_path.joinpath("data.json")
+
+    async def main():
+        jsons = Jsons(file)
+        await jsons.read()
+        jsons.update_option(1, prefix="!")
+        jsons.update_option(2, announcesongs=True)
+        jsons.update_option(2, announcesongs=False)
+        await jsons.flush()
+        assert jsons.journal.exists() and not file.exists()
+
+        reloaded = Jsons(file)
+        await reloaded.read()
+        return reloaded
+
+    reloaded = asyncio.run(main())
+    assert reloaded.get_option(1)["prefix"] == "!"
+    assert "2" not in reloaded.data
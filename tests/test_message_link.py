@@ -0,0 +1,110 @@
+import asyncio
+import shutil
+from types import SimpleNamespace
+
+import discord
+import pytest
+from aiohttp import web
+from discord.ext import commands
+
+import song as song_module
+from history import history
+from jsons import Jsons
+from play_sound import PlaySound
+from resolvers import Env
+from snapshot import SnapshotStore
+from tests.conftest import FakeChannel, FakeVoiceClient
+
+pytestmark = pytest.mark.skipif(
+    shutil.which("ffmpeg") is None, reason="ffmpeg is not installed"
+)
+
+
+class FakeContext:
+    def __init__(self, author) -> None:
+        self.guild = author.guild
+        self.author = author
+        self.channel = self
+        self.sent: list[str] = []
+
+    async def send(self, content: str):
+        self.sent.append(content)
+
+    async def defer(self):
+        pass
+
+
+def member(voice_clients: list[FakeVoiceClient]):
+    async def connect():
+        voice_clients.append(FakeVoiceClient(channel))
+        return voice_clients[-1]
+
+    guild = SimpleNamespace(
+        id=1, name="test", voice_client=None, get_member=lambda _: None
+    )
+    channel = SimpleNamespace(id=2, connect=connect)
+    return SimpleNamespace(id=1, guild=guild, voice=SimpleNamespace(channel=channel))
+
+
+def test_message_link_plays_end_to_end(tmp_path, monkeypatch, track):
+    monkeypatch.setattr(song_module.tempdir, "tempdir", tmp_path)
+    monkeypatch.setattr(history, "file", tmp_path.joinpath("history.sqlite3"))
+
+    async def serve(request: web.Request):
+        return web.Response(body=track, content_type="audio/wav")
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/track.wav", serve)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        message = SimpleNamespace(
+            attachments=[
+                SimpleNamespace(
+                    filename="track.wav",
+                    content_type="audio/wav",
+                    size=len(track),
+                    url=f"http://127.0.0.1:{port}/track.wav",
+                )
+            ],
+            jump_url="https://discord.com/channels/1/2/3",
+        )
+        channel = FakeChannel({3: message})
+
+        voice_clients: list[FakeVoiceClient] = []
+        ctx = FakeContext(member(voice_clients))
+        async with commands.Bot(
+            command_prefix="!", intents=discord.Intents.none()
+        ) as bot:
+            cog = PlaySound(bot)
+            cog.warm_cache.cancel()
+            cog.save_snapshots.cancel()
+            cog.data = Jsons(tmp_path.joinpath("data.json"))
+            cog.snapshots = SnapshotStore(tmp_path.joinpath("snapshot.json"))
+            client = SimpleNamespace(get_channel=lambda _: channel)
+            cog.env = Env(cog.http, client)  # type: ignore
+            try:
+                await PlaySound.play.callback(  # type: ignore
+                    cog, ctx, "https://discord.com/channels/1/2/3"
+                )
+                assert len(voice_clients) == 1
+                played = await asyncio.to_thread(voice_clients[0].finished.wait, 10)
+                assert played
+                assert voice_clients[0].frames > 0
+                player = cog.players[1]
+                for _ in range(50):
+                    if player.now_play is None:
+                        break
+                    await asyncio.sleep(0.01)
+                assert player.now_play is None
+                await player.voice_client.disconnect()
+                cog.drop_player(1)
+            finally:
+                await cog.http.close()
+                await history.close()
+                await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+from types import SimpleNamespace
+
+from jsons import Jsons
+from permissions import PermissionCache
+
+DJ_ROLE = 10
+OTHER_ROLE = 20
+
+
+def member(id: int, roles: list[int], manage_roles: bool = False, guild_id: int = 1):
+    return SimpleNamespace(
+        id=id,
+        guild=SimpleNamespace(id=guild_id),
+        roles=[SimpleNamespace(id=x) for x in roles],
+        guild_permissions=SimpleNamespace(manage_roles=manage_roles),
+        get_role=lambda x: SimpleNamespace(id=x) if x in roles else None,
+    )
+
+
+def data(tmp_path, dj_id: int | None = DJ_ROLE):
+    jsons = Jsons(tmp_path.joinpath("data.json"))
+    if dj_id is not None:
+        jsons.data["1"] = {**jsons.get_option(1), "dj_id": dj_id}
+    return jsons
+
+
+def test_decisions_are_cached_until_the_member_changes(tmp_path):
+    cache = PermissionCache()
+    jsons = data(tmp_path)
+    alice = member(1, [DJ_ROLE])
+    assert cache.get(alice, jsons).dj  # type: ignore
+
+    # a stale member object keeps hitting the cache
+    assert cache.get(member(1, []), jsons).dj  # type: ignore
+    cache.invalidate_member(1, 1)
+    assert not cache.get(member(1, []), jsons).dj  # type: ignore
+
+
+def test_role_invalidation_only_drops_its_holders(tmp_path):
+    cache = PermissionCache()
+    jsons = data(tmp_path)
+    cache.get(member(1, [DJ_ROLE]), jsons)  # type: ignore
+    cache.get(member(2, [OTHER_ROLE], manage_roles=True), jsons)  # type: ignore
+    cache.invalidate_role(1, DJ_ROLE)
+    assert set(cache.guilds[1]) == {2}
+    assert cache.get(member(2, []), jsons).mod  # type: ignore
+
+
+def test_guild_invalidation_follows_settings(tmp_path):
+    cache = PermissionCache()
+    jsons = data(tmp_path)
+    cache.get(member(1, [], guild_id=2), jsons)  # type: ignore
+    assert not cache.get(member(1, []), jsons).dj  # type: ignore
+    jsons.data["1"]["dj_id"] = None
+    assert not cache.get(member(1, []), jsons).dj  # type: ignore
+    cache.invalidate_guild(1)
+    assert cache.get(member(1, []), jsons).dj  # type: ignore
+    assert 2 in cache.guilds
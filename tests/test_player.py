@@ -0,0 +1,66 @@
+import asyncio
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+import discord
+
+from errors import AudioExtensionError, AudioSizeError
+from player import Player
+from song import Song
+from tests.conftest import FakeChannel, FakeVoiceClient
+
+
+class Silence(discord.AudioSource):
+    def read(self) -> bytes:
+        return b""
+
+
+@dataclass
+class FakeSong(Song):
+    url: str
+    error: Exception | None = None
+
+    def create_task(self):
+        async def task():
+            if self.error is not None:
+                raise self.error
+            return self.url
+
+        return asyncio.create_task(task())
+
+    async def get_source(self):
+        await self.materialize()
+        return Silence()
+
+
+def author():
+    return SimpleNamespace(id=1, guild=SimpleNamespace(id=1))
+
+
+def test_failed_open_moves_to_next_song():
+    async def main():
+        voice_client = FakeVoiceClient(autoplay=False)
+        player = Player(voice_client, asyncio.get_running_loop())  # type: ignore
+        channel = FakeChannel()
+        player.text_channel = channel  # type: ignore
+        bad = [
+            FakeSong(author(), "https://example.com/big", AudioSizeError()),
+            FakeSong(author(), "https://example.com/text", AudioExtensionError()),
+        ]
+        good = FakeSong(author(), "https://example.com/ok")
+        good.title = "ok"
+        for song in [*bad, good]:
+            song.title = song.title or "bad"
+            player.add(song)
+        for _ in range(50):
+            if voice_client.played:
+                break
+            await asyncio.sleep(0.01)
+
+        assert len(voice_client.played) == 1
+        assert player.now_play is good
+        assert all(x.holds == 0 and x.flight is None for x in bad)
+        assert channel.sent == ["bad は再生できへんかった"] * 2
+        player.close()
+
+    asyncio.run(main())
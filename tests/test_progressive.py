@@ -0,0 +1,96 @@
+import subprocess
+import threading
+from pathlib import Path
+
+from progressive import Buffer, GrowingFile, ProgressiveAudio
+
+
+def make_reader(tmp_path: Path, timeout: float = 5.0):
+    buffer = Buffer(tmp_path.joinpath("track.wav"))
+    buffer.path.write_bytes(b"a" * 100)
+    reader = GrowingFile(buffer, timeout=timeout, rebuffer=50)
+    return buffer, reader
+
+
+def append(buffer: Buffer, data: bytes):
+    with open(buffer.path, "ab") as f:
+        f.write(data)
+
+
+def test_stall_resume_end(tmp_path: Path):
+    buffer, reader = make_reader(tmp_path)
+    events: list[str] = []
+    stalled = threading.Event()
+
+    def underrun():
+        events.append("underrun")
+        stalled.set()
+
+    reader.on_underrun = underrun
+    reader.on_recover = lambda: events.append("recover")
+
+    assert reader.read(100) == b"a" * 100
+
+    def writer():
+        stalled.wait(5)
+        append(buffer, b"b" * 60)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert reader.read(100) == b"b" * 60
+    thread.join()
+    assert events == ["underrun", "recover"]
+
+    append(buffer, b"c" * 10)
+    buffer.finish()
+    assert reader.read(100) == b"c" * 10
+    assert reader.read(100) == b""
+    assert reader.position == 170
+    reader.close()
+
+
+def test_stall_times_out(tmp_path: Path):
+    _buffer, reader = make_reader(tmp_path, timeout=0.1)
+    events: list[str] = []
+    reader.on_underrun = lambda: events.append("underrun")
+    reader.on_recover = lambda: events.append("recover")
+
+    assert reader.read(100) == b"a" * 100
+    assert reader.read(100) == b""
+    assert events == ["underrun", "recover"]
+    reader.close()
+
+
+def test_failed_download_ends_stream(tmp_path: Path):
+    buffer, reader = make_reader(tmp_path)
+    stalled = threading.Event()
+    reader.on_underrun = stalled.set
+
+    assert reader.read(100) == b"a" * 100
+
+    def writer():
+        stalled.wait(5)
+        buffer.finish(failed=True)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    assert reader.read(100) == b""
+    thread.join()
+    reader.close()
+
+
+def test_cleanup_after_eof(tmp_path: Path):
+    buffer, reader = make_reader(tmp_path)
+    buffer.finish()
+    audio = ProgressiveAudio.__new__(ProgressiveAudio)
+    audio.reader = reader
+    audio._process = subprocess.Popen(
+        ["cat"], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL
+    )
+    audio._stdin = audio._process.stdin
+    audio._stdout = audio._process.stdout  # type: ignore
+
+    audio._pipe_writer(reader)
+    assert audio._stdin is None
+    audio.cleanup()
+    assert reader.closed
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from queues import BlockedList, Queue
+
+
+class Item:
+    def __init__(self, n: int, key: str | None = None) -> None:
+        self.n = n
+        self.key = key
+
+    def __repr__(self):
+        return f"Item({self.n})"
+
+
+def check(blocked: BlockedList, model: list):
+    assert len(blocked) == len(model)
+    assert list(blocked) == model
+    assert all(blocked[i] is x for i, x in enumerate(model))
+    for x in model:
+        assert x in blocked
+        assert blocked.index(x) == next(i for i, y in enumerate(model) if y is x)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_blocked_list_matches_list(seed: int):
+    rng = random.Random(seed)
+    items = [Item(n) for n in range(40)]
+    model = [rng.choice(items) for _ in range(rng.randrange(30))]
+    blocked = BlockedList(model, load=4)
+    check(blocked, model)
+    for _ in range(300):
+        op = rng.randrange(6)
+        if op == 0 or not model:
+            i = rng.randrange(-len(model) - 2, len(model) + 3)
+            item = rng.choice(items)
+            blocked.insert(i, item)
+            model.insert(i, item)
+        elif op == 1:
+            i = rng.randrange(-len(model), len(model))
+            assert blocked.pop(i) is model.pop(i)
+        elif op == 2:
+            old, new = rng.randrange(len(model)), rng.randrange(len(model))
+            blocked.insert(new, blocked.pop(old))
+            model.insert(new, model.pop(old))
+        elif op == 3:
+            k = rng.randrange(len(model) + 3)
+            assert blocked.drop_front(k) == model[:k]
+            del model[:k]
+        elif op == 4:
+            mod = rng.randrange(7)
+            assert blocked.remove_where(lambda x, mod=mod: x.n % 7 == mod) == [
+                x for x in model if x.n % 7 == mod
+            ]
+            model = [x for x in model if x.n % 7 != mod]
+        else:
+            batch = [rng.choice(items) for _ in range(rng.randrange(10))]
+            blocked.extend(batch)
+            model.extend(batch)
+        check(blocked, model)
+        gone = [x for x in items if all(x is not y for y in model)]
+        assert not any(x in blocked for x in gone)
+        for x in gone:
+            with pytest.raises(ValueError):
+                blocked.index(x)
+
+
+def test_drop_front_compacts_stale_entries():
+    items = [Item(n) for n in range(100)]
+    blocked = BlockedList(items, load=4)
+    blocked.drop_front(60)
+    blocked.drop_front(30)
+    assert len(blocked._where) == len(blocked)
+    assert list(blocked) == items[90:]
+
+
+def test_queue_counts_duplicate_keys():
+    queue: Queue[Item] = Queue(key=lambda x: x.key)
+    a1, a2, a3 = (Item(n, "a") for n in range(3))
+    b, anonymous = Item(3, "b"), Item(4)
+    queue.put(a1)
+    queue.put_many([b, a2, anonymous])
+    queue.put_first(a3)
+    assert (queue.count("a"), queue.count("b"), queue.count(None)) == (3, 1, 0)
+
+    queue.move(0, 3)
+    assert queue.count("a") == 3
+    assert queue.get_nowait() is a1
+    assert queue.count("a") == 2
+    assert queue.remove_index(queue.index(a3)) is a3
+    assert queue.count("a") == 1
+    assert queue.remove_where(lambda x: x.key == "b") == [b]
+    assert queue.count("b") == 0
+    assert "b" not in queue._keys
+    queue.insert(0, a1)
+    assert queue.drop_front(2) == [a1, a2]
+    assert queue.count("a") == 0 and list(queue) == [anonymous]
+
+    queue.put_many([a1, a2])
+    queue.clear()
+    assert queue.count("a") == 0 and not queue._keys
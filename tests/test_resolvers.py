@@ -0,0 +1,89 @@
+import pytest
+
+import song  # noqa: F401  registers the song resolvers
+from errors import AudioUrlError
+from resolvers import Resolvers, canonical_key, resolvers
+
+ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        f"https://www.youtube.com/watch?v={ID}",
+        f"https://www.youtube.com/watch?v={ID}&t=42",
+        f"https://music.youtube.com/watch?list=RDx&v={ID}",
+        f"https://m.youtube.com/shorts/{ID}",
+        f"https://youtube.com/embed/{ID}",
+        f"https://youtu.be/{ID}?si=share",
+        f"  https://youtu.be/{ID}  ",
+    ],
+)
+def test_youtube_urls_share_one_key(url: str):
+    match = resolvers.resolve(url)
+    assert match.key == f"youtube:{ID}"
+    assert not match.playlist
+    assert canonical_key(url) == f"youtube:{ID}"
+
+
+@pytest.mark.parametrize(
+    "url, name, key, playlist",
+    [
+        (
+            "https://www.youtube.com/playlist?list=PLabc",
+            "youtube_playlist",
+            "youtube_playlist:PLabc",
+            True,
+        ),
+        (
+            "https://SoundCloud.com/User/Track",
+            "soundcloud",
+            "soundcloud:user/track",
+            False,
+        ),
+        (
+            "https://soundcloud.com/user/sets/Mix",
+            "soundcloud_set",
+            "soundcloud_set:user/mix",
+            True,
+        ),
+        (
+            "https://soundcloud.com/user",
+            "soundcloud_user",
+            "soundcloud_user:user",
+            True,
+        ),
+        ("https://discord.com/channels/1/2/3", "discord", "discord:2/3", False),
+        (
+            "https://canary.discord.com/channels/@me/2/3",
+            "discord",
+            "discord:2/3",
+            False,
+        ),
+    ],
+)
+def test_resolver_and_key(url: str, name: str, key: str, playlist: bool):
+    match = resolvers.resolve(url)
+    assert (match.resolver.name, match.key, match.playlist) == (name, key, playlist)
+
+
+def test_unmatched_urls_fall_back_to_normalized_url():
+    assert (
+        canonical_key("HTTPS://Example.COM/a/B.mp3?x=1#frag")
+        == "url:https://example.com/a/B.mp3?x=1"
+    )
+    assert canonical_key("ftp://example.com/a.mp3") is None
+    assert canonical_key("not a url") is None
+    with pytest.raises(AudioUrlError):
+        resolvers.resolve("https://example.com/a.mp3")
+
+
+def test_earlier_registration_wins_and_recompiles():
+    registry = Resolvers()
+    registry.register("first", r"https://x\.test/(?P<id>\w+)")(object)
+    assert registry.resolve("https://x.test/abc").key == "first:abc"
+    registry.register("second", r"https://x\.test/(?P<id>\w+)/(?P<sub>\w+)")(object)
+    assert registry.compiled is None
+    assert registry.resolve("https://x.test/abc/def").key == "first:abc"
+    registry.register("third", r"https://y\.test/(?P<id>\w+)", "first")(object)
+    assert registry.resolve("https://y.test/abc").key == "first:abc"
@@ -0,0 +1,44 @@
+import asyncio
+from dataclasses import dataclass
+from types import SimpleNamespace
+
+from metrics import download_bytes, download_seconds, downloads
+from song import Song
+
+
+@dataclass
+class CachedSong(Song):
+    file: str
+    hit: bool = False
+
+    def create_task(self):
+        async def task():
+            self.cached = self.hit
+            return self.file
+
+        return asyncio.create_task(task())
+
+    async def get_source(self):
+        raise NotImplementedError
+
+
+def test_cache_hits_are_not_counted_as_transfers(tmp_path):
+    path = tmp_path.joinpath("track.opus")
+    author = SimpleNamespace(id=1, guild=SimpleNamespace(id=1))
+    ok = (("kind", "CachedSong"), ("result", "ok"))
+    cached = (("kind", "CachedSong"), ("result", "cached"))
+    kind = (("kind", "CachedSong"),)
+
+    async def main():
+        for hit in (True, False):
+            path.write_bytes(b"\0" * 1024)
+            song = CachedSong(author, str(path), hit)
+            await song.materialize()
+            await asyncio.sleep(0)
+            song.after()
+
+    asyncio.run(main())
+    assert downloads.values[cached] == 1
+    assert downloads.values[ok] == 1
+    assert sum(download_seconds.counts[kind]) == 1
+    assert sum(download_bytes.counts[kind]) == 1
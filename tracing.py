@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Protocol
+
+from shards import worker_path
+
+TRACE_SAMPLE_RATE = float(os.environ.get("PLAY_SOUND_TRACE_SAMPLE", "1.0"))
+TRACE_FILE = os.environ.get("PLAY_SOUND_TRACE_FILE")
+RING_SIZE = 512
+JSONL_BATCH = 64
+
+
+class Trace:
+    __slots__ = ("base", "events", "started_at")
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.base = time.monotonic()
+        self.events: list[tuple[str, float, dict[str, Any]]] = []
+
+    def add(self, event: str, attrs: dict[str, Any]):
+        self.events.append((event, time.monotonic() - self.base, attrs))
+
+    def to_dict(self, **info: Any) -> dict[str, Any]:
+        return {
+            **info,
+            "started_at": self.started_at,
+            "events": [
+                {"event": name, "ms": round(at * 1000, 3), **attrs}
+                for name, at, attrs in self.events
+            ],
+        }
+
+
+class Sink(Protocol):
+    def emit(self, record: dict[str, Any]) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class RingBufferSink:
+    def __init__(self, size: int = RING_SIZE) -> None:
+        self.records: deque[dict[str, Any]] = deque(maxlen=size)
+
+    def emit(self, record: dict[str, Any]):
+        self.records.append(record)
+
+    def query(self, guild_id: int | None = None, limit: int = 10):
+        res = []
+        for record in reversed(self.records):
+            if guild_id is not None and record.get("guild") != guild_id:
+                continue
+            res.append(record)
+            if len(res) >= limit:
+                break
+        return res
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    def __init__(self, file: Path, batch: int = JSONL_BATCH) -> None:
+        self.file = file
+        self.batch = batch
+        self.lines: list[str] = []
+
+    def write(self, lines: list[str]):
+        with open(self.file, "a") as f:
+            f.writelines(lines)
+
+    def emit(self, record: dict[str, Any]):
+        self.lines.append(json.dumps(record) + "\n")
+        if len(self.lines) >= self.batch:
+            lines, self.lines = self.lines, []
+            asyncio.get_running_loop().run_in_executor(None, self.write, lines)
+
+    def close(self):
+        if self.lines:
+            lines, self.lines = self.lines, []
+            self.write(lines)
+
+
+class Tracer:
+    def __init__(self, rate: float = TRACE_SAMPLE_RATE) -> None:
+        self.rate = rate
+        self.ring = RingBufferSink()
+        self.sinks: list[Sink] = [self.ring]
+        if TRACE_FILE:
+            self.sinks.append(JsonlSink(worker_path(Path(TRACE_FILE))))
+
+    def start(self) -> Trace | None:
+        if self.rate <= 0 or (self.rate < 1 and random.random() >= self.rate):
+            return None
+        return Trace()
+
+    def emit(self, trace: Trace, **info: Any):
+        record = trace.to_dict(**info)
+        for sink in self.sinks:
+            sink.emit(record)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+tracer = Tracer()